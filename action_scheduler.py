@@ -0,0 +1,322 @@
+"""
+Key hold scheduling and gesture combos.
+
+The listener used to hold every key for a fixed 0.1s with time.sleep(),
+blocking packet processing meanwhile. ActionScheduler presses immediately
+and leaves the release to a single timer thread, so the packet loop never
+sleeps. How long each action stays held is a per-action policy, counted in
+game frames (the game polls input at 60 Hz):
+
+- "frames":       a fixed number of frames
+- "gesture":      held while the motion lasts (until it falls below
+                  release_fraction of the threshold), within min/max frames
+- "proportional": longer for stronger gestures: min_frames at the threshold,
+                  max_frames at full_at_ratio times the threshold. Handy for
+                  Silksong's variable-height jump.
+
+ComboEngine turns gestures that happen close together into combos, such as
+jump + attack for a down-slash or a quick double-step for a dash.
+
+Check timer precision on this machine with:
+    python action_scheduler.py --jitter
+"""
+
+import heapq
+import itertools
+import random
+import statistics
+import sys
+import threading
+import time
+from collections import deque
+
+HOLD_POLICIES = ("frames", "gesture", "proportional")
+# Condition.wait() can be a whole OS tick late (~15ms on Windows); wake up
+# this much early and finish with time.sleep(), which is high-resolution
+COARSE_WAKE_MARGIN_SEC = 0.002
+
+
+class HoldPolicy:
+    """How long one action is held, from its config entry."""
+
+    def __init__(self, spec, frame_sec):
+        self.kind = spec.get("policy", "frames")
+        if self.kind not in HOLD_POLICIES:
+            raise ValueError(f"Unknown hold policy '{self.kind}' (use one of {', '.join(HOLD_POLICIES)})")
+        self.frame_sec = frame_sec
+        self.frames = spec.get("frames", 6)
+        self.min_frames = spec.get("min_frames", 2)
+        self.max_frames = spec.get("max_frames", 20)
+        self.full_at_ratio = spec.get("full_at_ratio", 1.6)
+        self.release_fraction = spec.get("release_fraction", 0.5)
+
+    def hold_sec(self, value=None, threshold=None):
+        """Hold time for a gesture of this magnitude (the most it could be, for "gesture")."""
+        if self.kind == "frames":
+            return self.frames * self.frame_sec
+        if self.kind == "gesture" or not value or not threshold:
+            return self.max_frames * self.frame_sec
+        fraction = (value / threshold - 1.0) / max(1e-9, self.full_at_ratio - 1.0)
+        fraction = min(1.0, max(0.0, fraction))
+        return (self.min_frames + fraction * (self.max_frames - self.min_frames)) * self.frame_sec
+
+
+class ActionScheduler:
+    """
+    Presses keys right away and releases them from one timer thread.
+
+    Args:
+        backend (OutputBackend): Where presses and releases go
+        hold_config (dict): action -> hold policy spec
+        frame_rate (float): Game frames per second that policies count in
+    """
+
+    def __init__(self, backend, hold_config=None, frame_rate=60.0):
+        self.backend = backend
+        self.frame_sec = 1.0 / frame_rate
+        self.policies = {
+            action: HoldPolicy(spec, self.frame_sec) for action, spec in (hold_config or {}).items()
+        }
+        # Same as the old fixed 0.1s hold
+        self.default_policy = HoldPolicy({"policy": "frames", "frames": 6}, 1.0 / 60.0)
+
+        # action -> {"pressed_at", "release_at", "generation", "peak", "threshold", "policy"}
+        self.held = {}
+        self._timers = []
+        self._generations = itertools.count()
+        self._condition = threading.Condition()
+        self._running = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+        self.releases = 0
+        self.max_lateness_sec = 0.0
+
+    def start(self):
+        self._running = True
+        self._thread.start()
+
+    # --- Called from the listener ---
+    def trigger(self, action, value=None, threshold=None):
+        """A gesture was detected: press (unless already held) and schedule the release."""
+        policy = self.policies.get(action, self.default_policy)
+        with self._condition:
+            entry = self.held.get(action)
+            if entry is None:
+                entry = self._press(action, time.perf_counter())
+            entry["policy"] = policy
+            entry["peak"] = value
+            entry["threshold"] = threshold
+            self._schedule(action, entry, entry["pressed_at"] + policy.hold_sec(value, threshold))
+
+    def hold(self, action, max_sec):
+        """Press now and keep holding until trigger() or release(); max_sec is a safety limit."""
+        with self._condition:
+            entry = self.held.get(action)
+            if entry is None:
+                entry = self._press(action, time.perf_counter())
+            self._schedule(action, entry, time.perf_counter() + max_sec)
+
+    def release(self, action):
+        """Release now (e.g. a cancelled early jump)."""
+        with self._condition:
+            entry = self.held.pop(action, None)
+            if entry is not None:
+                self.backend.release(action)
+
+    def tap(self, actions, frames):
+        """Press several actions together and release them all after some frames (combos)."""
+        now = time.perf_counter()
+        with self._condition:
+            for action in actions:
+                entry = self.held.get(action)
+                if entry is None:
+                    entry = self._press(action, now)
+                entry["policy"] = None
+                self._schedule(action, entry, max(entry["release_at"], now + frames * self.frame_sec))
+
+    def feed(self, action, value):
+        """
+        Follow a held gesture sample by sample.
+
+        "gesture" holds end when the motion fades; "proportional" holds grow
+        while the peak is still rising. Cheap when the action isn't held.
+        """
+        entry = self.held.get(action)
+        if entry is None:
+            return
+        policy = entry.get("policy")
+        if policy is None or entry["threshold"] is None:
+            return
+
+        with self._condition:
+            if self.held.get(action) is not entry:
+                return
+            if policy.kind == "gesture":
+                if value < entry["threshold"] * policy.release_fraction:
+                    earliest = entry["pressed_at"] + policy.min_frames * self.frame_sec
+                    release_at = max(time.perf_counter(), earliest)
+                    if release_at < entry["release_at"]:
+                        self._schedule(action, entry, release_at)
+            elif policy.kind == "proportional" and value > (entry["peak"] or 0.0):
+                entry["peak"] = value
+                release_at = entry["pressed_at"] + policy.hold_sec(value, entry["threshold"])
+                if release_at > entry["release_at"]:
+                    self._schedule(action, entry, release_at)
+
+    def close(self):
+        """Stop the timer thread and release everything still held."""
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        if self._thread.is_alive():
+            self._thread.join()
+        for action in list(self.held):
+            self.release(action)
+
+    # --- Internals (hold self._condition) ---
+    def _press(self, action, now):
+        self.backend.press(action)
+        entry = {
+            "pressed_at": now, "release_at": now, "generation": 0,
+            "peak": None, "threshold": None, "policy": None,
+        }
+        self.held[action] = entry
+        return entry
+
+    def _schedule(self, action, entry, release_at):
+        # A new generation makes any earlier timer for this press a no-op
+        entry["generation"] = next(self._generations)
+        entry["release_at"] = release_at
+        heapq.heappush(self._timers, (release_at, entry["generation"], action))
+        self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._running and not self._timers:
+                    self._condition.wait()
+                if not self._running:
+                    return
+                due, generation, action = self._timers[0]
+                remaining = due - time.perf_counter()
+                if remaining > COARSE_WAKE_MARGIN_SEC:
+                    # Woken early by a new timer, or close enough to finish precisely
+                    self._condition.wait(remaining - COARSE_WAKE_MARGIN_SEC)
+                    continue
+                heapq.heappop(self._timers)
+
+            # Outside the lock, so the listener can keep pressing meanwhile
+            remaining = due - time.perf_counter()
+            if remaining > 0:
+                time.sleep(remaining)
+
+            with self._condition:
+                entry = self.held.get(action)
+                if entry is None or entry["generation"] != generation:
+                    # Rescheduled or already released
+                    continue
+                del self.held[action]
+                self.backend.release(action)
+                lateness = time.perf_counter() - due
+                self.releases += 1
+                self.max_lateness_sec = max(self.max_lateness_sec, lateness)
+
+
+class ComboEngine:
+    """
+    Spots combos in the stream of detected gestures.
+
+    Each combo spec is either a chord (gestures in any order) or a sequence
+    (gestures in this order), all within window_ms:
+        {"name": "down_slash", "chord": ["jump", "attack"], "window_ms": 200,
+         "keys": ["down", "attack"], "frames": 4}
+        {"name": "dash", "sequence": ["step", "step"], "window_ms": 250,
+         "keys": ["dash"], "frames": 2}
+    """
+
+    def __init__(self, combos):
+        self.combos = []
+        for spec in combos:
+            if "chord" not in spec and "sequence" not in spec:
+                raise ValueError(f"Combo '{spec.get('name')}' needs a 'chord' or 'sequence'")
+            self.combos.append(spec)
+        longest = max((len(spec.get("chord") or spec.get("sequence")) for spec in self.combos), default=1)
+        self.recent = deque(maxlen=max(8, longest * 2))
+
+    def observe(self, gesture, timestamp):
+        """
+        Record one detected gesture.
+
+        Args:
+            gesture (str): "jump", "attack", "step", "turn", ...
+            timestamp (float): Sensor time in seconds
+
+        Returns:
+            dict: The combo spec completed by this gesture, or None
+        """
+        self.recent.append((timestamp, gesture))
+        for spec in self.combos:
+            window = spec.get("window_ms", 200) / 1000.0
+            # Entries "from the future" belong to a sensor clock that was reset
+            in_window = [g for t, g in self.recent if 0.0 <= timestamp - t <= window]
+            if "sequence" in spec:
+                sequence = spec["sequence"]
+                matched = in_window[-len(sequence):] == sequence
+            else:
+                chord = spec["chord"]
+                matched = gesture in chord and all(g in in_window for g in chord)
+            if matched:
+                # Each gesture completes at most one combo
+                self.recent.clear()
+                return spec
+        return None
+
+
+def run_jitter_test(samples=200, frame_rate=60.0, seed=1):
+    """
+    Measure how close releases land to their scheduled time.
+
+    Returns:
+        list: Release lateness of every tap in microseconds
+    """
+    from output_backends import RecordingBackend
+
+    backend = RecordingBackend()
+    scheduler = ActionScheduler(backend, {"jump": {"policy": "frames", "frames": 1}}, frame_rate)
+    scheduler.start()
+    rng = random.Random(seed)
+    expected = []
+    try:
+        for _ in range(samples):
+            frames = rng.randint(1, 6)
+            scheduler.tap(["jump"], frames)
+            pressed = time.perf_counter()
+            expected.append(pressed + frames * scheduler.frame_sec)
+            # Wait for the release, plus a random gap like real play
+            time.sleep(frames * scheduler.frame_sec + rng.uniform(0.005, 0.02))
+    finally:
+        scheduler.close()
+
+    releases = [ns / 1e9 for ns, kind, _, _ in backend.events if kind == "release"]
+    return [max(0.0, actual - due) * 1e6 for actual, due in zip(releases, expected)]
+
+
+def main():
+    """
+    Command-line interface for checking timer precision.
+    """
+    if len(sys.argv) > 1 and sys.argv[1] == "--jitter":
+        print("Scheduling 200 taps of 1-6 frames...")
+        lateness = run_jitter_test()
+        print(
+            f"Release lateness: p50 {statistics.median(lateness):.0f}us, "
+            f"p99 {statistics.quantiles(lateness, n=100)[98]:.0f}us, "
+            f"max {max(lateness):.0f}us"
+        )
+    else:
+        print("Usage:")
+        print("  python action_scheduler.py --jitter    # Measure key release timing precision")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+"""
+Online threshold adaptation for long play sessions.
+
+Players tire, and their punches and hops weaken, so thresholds from a single
+calibrate.py run slowly drift out of step with the player. The adapter keeps
+constant-memory streaming quantile estimates (the P² algorithm) of:
+
+- confirmed gesture peaks: the largest value seen shortly after a gesture fired
+- the noise floor: values seen while no gesture is in progress
+
+and nudges each threshold toward a target between the two, clamped to the
+bounds set in config.json. Every update is O(1) per sample.
+
+Learned values are saved periodically on a background thread under
+"adaptive_thresholds" -> "learned" in config.json, next to the calibrated
+value they started from. The calibrated thresholds are never overwritten, so
+the default bounds stay anchored to them across sessions, and running
+calibrate.py again discards values learned from the old calibration.
+"""
+
+import json
+import os
+import threading
+
+from orientation import CLOCK_RESET_SEC
+
+
+class P2Quantile:
+    """
+    Streaming quantile estimate using the P² algorithm (Jain & Chlamtac, 1985).
+
+    Keeps five markers regardless of how many values are added.
+    """
+
+    def __init__(self, quantile):
+        self.p = quantile
+        self.count = 0
+        self.heights = []
+        self.positions = [1, 2, 3, 4, 5]
+        self.desired = [1, 1 + 2 * quantile, 1 + 4 * quantile, 3 + 2 * quantile, 5]
+        self.increments = [0, quantile / 2, quantile, (1 + quantile) / 2, 1]
+
+    def add(self, x):
+        self.count += 1
+        if self.count <= 5:
+            self.heights.append(x)
+            self.heights.sort()
+            return
+
+        h = self.heights
+        n = self.positions
+
+        # Find the cell x falls in, extending the extremes if needed
+        if x < h[0]:
+            h[0] = x
+            k = 0
+        elif x >= h[4]:
+            h[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= h[k + 1]:
+                k += 1
+
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+
+        # Adjust the three middle markers toward their desired positions
+        for i in range(1, 4):
+            d = self.desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                step = 1 if d > 0 else -1
+                candidate = self._parabolic(i, step)
+                if h[i - 1] < candidate < h[i + 1]:
+                    h[i] = candidate
+                else:
+                    h[i] = h[i] + step * (h[i + step] - h[i]) / (n[i + step] - n[i])
+                n[i] += step
+
+    def _parabolic(self, i, step):
+        h = self.heights
+        n = self.positions
+        return h[i] + step / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + step) * (h[i + 1] - h[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - step) * (h[i] - h[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    def value(self):
+        """Returns the current estimate, or None before any values are added."""
+        if self.count == 0:
+            return None
+        if self.count <= 5:
+            index = round(self.p * (len(self.heights) - 1))
+            return self.heights[index]
+        return self.heights[2]
+
+
+class RollingP2Quantile:
+    """
+    A P² estimate that forgets old data.
+
+    Two staggered estimators are kept; every window/2 values the older one is
+    replaced, so the reported estimate always covers between window/2 and
+    window of the most recent values.
+    """
+
+    def __init__(self, quantile, window):
+        self.quantile = quantile
+        self.half_window = max(5, window // 2)
+        self.current = P2Quantile(quantile)
+        self.next = P2Quantile(quantile)
+
+    @property
+    def count(self):
+        return self.current.count
+
+    def add(self, x):
+        self.current.add(x)
+        self.next.add(x)
+        if self.next.count >= self.half_window:
+            self.current = self.next
+            self.next = P2Quantile(self.quantile)
+
+    def value(self):
+        return self.current.value()
+
+
+class GestureTracker:
+    """Peak and noise estimates plus the live threshold for one gesture."""
+
+    def __init__(self, threshold, bounds, settings):
+        self.threshold = threshold
+        self.min_threshold, self.max_threshold = bounds
+        self.peaks = RollingP2Quantile(
+            settings.get("peak_quantile", 0.25), settings.get("peak_window", 20)
+        )
+        self.noise = RollingP2Quantile(
+            settings.get("noise_quantile", 0.99), settings.get("noise_window", 3000)
+        )
+        self.peak_ratio = settings.get("peak_ratio", 0.85)
+        self.noise_margin = settings.get("noise_margin", 1.5)
+        self.rate = settings.get("rate", 0.2)
+        self.min_peaks = settings.get("min_peaks", 5)
+        # Peak capture for the gesture currently in progress
+        self.capture_until = 0.0
+        self.capture_peak = None
+
+    def add_peak(self, peak):
+        self.peaks.add(peak)
+        if self.peaks.count < self.min_peaks:
+            return
+
+        # Aim a little below typical recent peaks, but stay clear of the noise
+        target = self.peaks.value() * self.peak_ratio
+        noise_floor = self.noise.value()
+        if noise_floor is not None:
+            target = max(target, noise_floor * self.noise_margin)
+
+        new_threshold = self.threshold + self.rate * (target - self.threshold)
+        self.threshold = min(self.max_threshold, max(self.min_threshold, new_threshold))
+
+
+class ThresholdAdapter:
+    """Tracks every adaptive gesture and persists the learned thresholds."""
+
+    def __init__(self, thresholds, adaptive_config, config_file="config.json"):
+        """
+        Args:
+            thresholds (dict): Gesture name ("jump"/"attack") -> calibrated threshold
+            adaptive_config (dict): The "adaptive_thresholds" config section
+            config_file (str): Where learned thresholds are saved
+        """
+        self.config_file = config_file
+        self.capture_sec = adaptive_config.get("peak_capture_sec", 0.15)
+        self.persist_interval_sec = adaptive_config.get("persist_interval_sec", 60.0)
+        self.last_persist = None
+        self.calibrated = dict(thresholds)
+
+        bounds = adaptive_config.get("bounds", {})
+        learned = adaptive_config.get("learned", {})
+        self.trackers = {}
+        for name, threshold in thresholds.items():
+            # Without configured bounds, allow +/-40% around the calibrated value
+            low, high = bounds.get(name, (threshold * 0.6, threshold * 1.4))
+            # Resume from the last session, unless calibrate.py has run since
+            start = threshold
+            entry = learned.get(name)
+            if isinstance(entry, dict) and entry.get("calibrated") == threshold:
+                start = min(high, max(low, entry.get("threshold", threshold)))
+            self.trackers[name] = GestureTracker(start, (low, high), adaptive_config)
+
+        # Saves run on background threads; one at a time, newest wins
+        self._save_lock = threading.Lock()
+        self._snapshot_seq = 0
+        self._saved_seq = 0
+
+        # No sample counts as noise while any gesture is still in progress
+        self.quiet_until = 0.0
+
+    def threshold(self, name):
+        return self.trackers[name].threshold
+
+    def observe(self, name, value, now):
+        """Feed one sample for a gesture. Call for every sample, fired or not."""
+        if now < self.quiet_until - CLOCK_RESET_SEC:
+            # Windows from the old clock would never end; drop them
+            self.quiet_until = 0.0
+            for other in self.trackers.values():
+                other.capture_peak = None
+        tracker = self.trackers[name]
+        if tracker.capture_peak is not None:
+            if now <= tracker.capture_until:
+                tracker.capture_peak = max(tracker.capture_peak, value)
+                return
+            tracker.add_peak(tracker.capture_peak)
+            tracker.capture_peak = None
+
+        if now > self.quiet_until:
+            tracker.noise.add(value)
+
+    def confirm(self, name, value, now):
+        """Record that a gesture fired; its peak is captured over the next moments."""
+        tracker = self.trackers[name]
+        tracker.capture_peak = value
+        tracker.capture_until = now + self.capture_sec
+        self.quiet_until = max(self.quiet_until, tracker.capture_until)
+
+    def maybe_persist(self, now):
+        """Save learned thresholds if the persist interval has passed."""
+        if self.last_persist is None:
+            self.last_persist = now
+            return
+        if now - self.last_persist < self.persist_interval_sec:
+            return
+        self.last_persist = now
+
+        # Disk I/O stays off the packet loop
+        threading.Thread(target=self._save, args=self._snapshot(), daemon=True).start()
+
+    def save_now(self):
+        """Save learned thresholds immediately (used at shutdown)."""
+        self._save(*self._snapshot())
+
+    def _snapshot(self):
+        self._snapshot_seq += 1
+        learned = {
+            name: {"calibrated": self.calibrated[name], "threshold": tracker.threshold}
+            for name, tracker in self.trackers.items()
+        }
+        return self._snapshot_seq, learned
+
+    def _save(self, seq, learned):
+        with self._save_lock:
+            if seq <= self._saved_seq:
+                # A newer snapshot was already written
+                return
+            temp_file = self.config_file + ".tmp"
+            try:
+                with open(self.config_file, "r", encoding="utf-8") as f:
+                    config = json.load(f)
+                config.setdefault("adaptive_thresholds", {})["learned"] = learned
+                # Write a full copy, then swap it in, so an interrupted save
+                # can never leave config.json truncated
+                with open(temp_file, "w", encoding="utf-8") as f:
+                    json.dump(config, f, indent=4)
+                os.replace(temp_file, self.config_file)
+                self._saved_seq = seq
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"\nWarning: Could not save adapted thresholds: {e}")
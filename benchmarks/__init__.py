@@ -0,0 +1,11 @@
+"""
+Benchmarks for the listener's hot loop.
+
+Run from the project root:
+    python -m benchmarks run -o baseline.json       # measure and save a baseline
+    python -m benchmarks check baseline.json        # measure again and compare
+    python -m benchmarks compare old.json new.json  # compare two saved runs
+
+`check` and `compare` exit with status 1 when any metric regresses past its
+tolerance, so they can gate performance work on udp_listener.py.
+"""
@@ -0,0 +1,163 @@
+"""
+Command-line interface for the benchmark suite.
+"""
+
+import argparse
+import datetime
+import json
+import platform
+import sys
+
+from benchmarks.pipeline import (
+    recorded_stream,
+    run_loopback_benchmark,
+    run_replay_benchmark,
+    synthetic_stream,
+)
+from benchmarks.stages import run_stage_benchmarks
+
+
+def run_all(recording=None, quick=False):
+    """
+    Run every benchmark.
+
+    Args:
+        recording (str): Optional session log to replay instead of synthetic data
+        quick (bool): Fewer repeats and a shorter stream, for a fast sanity check
+
+    Returns:
+        dict: {"meta": ..., "results": {metric: entry}}
+    """
+    if recording:
+        packets = recorded_stream(recording)
+        source = recording
+    else:
+        packets = synthetic_stream(repeat=1 if quick else 5)
+        source = "synthetic"
+
+    results = {}
+    print("Running stage benchmarks...")
+    results.update(run_stage_benchmarks(repeats=2 if quick else 7))
+    print(f"Replaying {len(packets)} packets ({source})...")
+    results.update(run_replay_benchmark(packets, rounds=1 if quick else 3))
+    print("Replaying over loopback UDP...")
+    results.update(run_loopback_benchmark(packets))
+
+    return {
+        "meta": {
+            "date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "stream": source,
+            "packets": len(packets),
+        },
+        "results": results,
+    }
+
+
+def print_results(run):
+    print(f"{'metric':<40} | {'value':>12} | unit")
+    for name, entry in run["results"].items():
+        print(f"{name:<40} | {entry['value']:12.2f} | {entry['unit']}")
+
+
+def compare(baseline, current, tolerance=None):
+    """
+    Compare two runs metric by metric.
+
+    Args:
+        baseline (dict): Earlier run
+        current (dict): New run
+        tolerance (float): Overrides each metric's own allowed relative change
+
+    Returns:
+        list: Names of metrics that regressed
+    """
+    regressions = []
+    print(f"{'metric':<40} | {'baseline':>12} | {'current':>12} | {'change':>8} | status")
+    for name, base in baseline["results"].items():
+        entry = current["results"].get(name)
+        if entry is None:
+            print(f"{name:<40} | {base['value']:12.2f} | {'missing':>12} |          | SKIP")
+            continue
+
+        allowed = tolerance if tolerance is not None else base.get("tolerance", 0.2)
+        lower_is_better = base.get("better", "lower") == "lower"
+        if base["value"]:
+            change = (entry["value"] - base["value"]) / base["value"]
+            regressed = change > allowed if lower_is_better else change < -allowed
+        else:
+            # No relative change from zero (e.g. pipeline.loopback.lost):
+            # any move the wrong way is a regression
+            change = None
+            regressed = entry["value"] > 0 if lower_is_better else entry["value"] < 0
+
+        status = "REGRESSED" if regressed else "ok"
+        if regressed:
+            regressions.append(name)
+        print(
+            f"{name:<40} | {base['value']:12.2f} | {entry['value']:12.2f} | "
+            f"{'n/a' if change is None else f'{change * 100:+7.1f}%':>8} | {status}"
+        )
+    return regressions
+
+
+def _load(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save(run, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(run, f, indent=4)
+    print(f"Results saved to {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run the benchmarks")
+    run_parser.add_argument("-o", "--output", help="Save results as JSON (e.g. a baseline)")
+    run_parser.add_argument("--recording", help="Session log with recorded packets to replay")
+    run_parser.add_argument("--quick", action="store_true", help="Shorter, noisier run")
+
+    check_parser = commands.add_parser("check", help="Run and compare against a baseline")
+    check_parser.add_argument("baseline", help="Baseline JSON from 'run -o'")
+    check_parser.add_argument("-o", "--output", help="Also save this run's results")
+    check_parser.add_argument("--recording", help="Session log with recorded packets to replay")
+    check_parser.add_argument("--quick", action="store_true", help="Shorter, noisier run")
+    check_parser.add_argument("--tolerance", type=float, help="Allowed relative change for every metric")
+
+    compare_parser = commands.add_parser("compare", help="Compare two saved runs")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--tolerance", type=float, help="Allowed relative change for every metric")
+
+    args = parser.parse_args()
+
+    if args.command == "run":
+        run = run_all(args.recording, args.quick)
+        print_results(run)
+        if args.output:
+            _save(run, args.output)
+        return
+
+    if args.command == "check":
+        baseline = _load(args.baseline)
+        current = run_all(args.recording, args.quick)
+        if args.output:
+            _save(current, args.output)
+    else:
+        baseline = _load(args.baseline)
+        current = _load(args.current)
+
+    regressions = compare(baseline, current, args.tolerance)
+    if regressions:
+        print(f"\nFAIL: {len(regressions)} metric(s) regressed: {', '.join(regressions)}")
+        sys.exit(1)
+    print("\nPASS: no regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+Full-pipeline benchmarks: a whole packet stream through the listener's logic.
+
+Streams come from phone_simulator.py (synthetic, seeded so runs are
+comparable) or from a session log recorded with the analysis pipeline's
+"log_packets" option. Packets go through udp_listener.PacketProcessor, the
+same code the listener runs, with key output sent to a NullBackend.
+"""
+
+import json
+import socket
+import statistics
+import time
+
+import udp_listener
+from instrumentation import ListenerStats
+from output_backends import NullBackend
+from phone_simulator import MotionModel, VirtualPhone, parse_script
+
+SYNTHETIC_SCRIPT = "idle:1,walk:4:2,hop,punch,turn:180,walk:4:2.5,punch,hop,idle:1"
+
+
+def synthetic_stream(repeat=5, seed=1234):
+    """Returns a list of raw packets from a seeded simulated session."""
+    motion = MotionModel(parse_script(SYNTHETIC_SCRIPT, repeat))
+    phone = VirtualPhone(0, motion, rate_hz=50.0, noise=0.3, seed=seed)
+    return [payload for _, payload in phone.packets()]
+
+
+def recorded_stream(path):
+    """Returns the raw packets stored in a session log (log_packets enabled)."""
+    packets = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            if "packet" in record:
+                packets.append(record["packet"].encode())
+    return packets
+
+
+# The listener's defaults, with every optional feature off
+REPLAY_CONFIG = {
+    "thresholds": {
+        "punch_threshold_xy_accel": 35.1,
+        "jump_threshold_z_accel": 33.6,
+        "turn_threshold_degrees": 120.0,
+        "fuel_added_per_step_sec": 0.4,
+        "max_fuel_sec": 1.0,
+    },
+    "keyboard_mappings": {"left": "Key.left", "right": "Key.right", "jump": "z", "attack": "x"},
+    "actions": {"frame_rate": 60.0},
+}
+
+
+class ListenerReplay:
+    """
+    udp_listener.PacketProcessor with key output discarded.
+
+    Args:
+        config (dict): Listener configuration (default: REPLAY_CONFIG), so
+                       optional features like jump prediction can be measured
+    """
+
+    def __init__(self, config=None):
+        self.stats = ListenerStats()
+        self.processor = udp_listener.PacketProcessor(
+            config or REPLAY_CONFIG, NullBackend(), self.stats, quiet=True
+        )
+
+    def process(self, data, now):
+        return self.processor.process(data, now, time.perf_counter_ns())
+
+    @property
+    def actions(self):
+        return dict(self.stats.actions)
+
+    @property
+    def errors(self):
+        return self.stats.decode_errors
+
+    def close(self):
+        self.processor.close()
+
+
+def _percentile(values, pct):
+    return statistics.quantiles(values, n=100)[pct - 1]
+
+
+def run_replay_benchmark(packets, rounds=3):
+    """
+    Push every packet through ListenerReplay, timing each one.
+
+    Returns:
+        dict: Metric name -> result entry
+    """
+    best_throughput = 0.0
+    latencies_us = []
+    for _ in range(rounds):
+        replay = ListenerReplay()
+        round_latencies = []
+        start = time.perf_counter()
+        for data in packets:
+            t0 = time.perf_counter_ns()
+            replay.process(data, t0 / 1e9)
+            round_latencies.append((time.perf_counter_ns() - t0) / 1000.0)
+        elapsed = time.perf_counter() - start
+        replay.close()
+        best_throughput = max(best_throughput, len(packets) / elapsed)
+        latencies_us.extend(round_latencies)
+
+    return {
+        "pipeline.replay.throughput": {
+            "value": best_throughput, "unit": "packets/s", "better": "higher", "tolerance": 0.25,
+        },
+        "pipeline.replay.latency_p50": {
+            "value": statistics.median(latencies_us), "unit": "us", "better": "lower", "tolerance": 0.25,
+        },
+        "pipeline.replay.latency_p99": {
+            "value": _percentile(latencies_us, 99), "unit": "us", "better": "lower", "tolerance": 0.5,
+        },
+    }
+
+
+def run_loopback_benchmark(packets, batch=200, timeout_sec=1.0):
+    """
+    Same as the replay, but every packet really crosses a loopback UDP socket.
+
+    Packets are sent in batches small enough to fit in the socket buffer, then
+    received and processed, so recvfrom() cost is included. If a datagram is
+    dropped anyway, the rest of its batch is given up after timeout_sec and
+    counted as lost rather than waited for forever.
+
+    Returns:
+        dict: Metric name -> result entry
+    """
+    receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver.bind(("127.0.0.1", 0))
+    receiver.settimeout(timeout_sec)
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    target = receiver.getsockname()
+
+    replay = ListenerReplay()
+    processed = 0
+    lost = 0
+    waited = 0.0
+    start = time.perf_counter()
+    try:
+        for offset in range(0, len(packets), batch):
+            chunk = packets[offset:offset + batch]
+            for data in chunk:
+                sender.sendto(data, target)
+            for received in range(len(chunk)):
+                try:
+                    data, _ = receiver.recvfrom(2048)
+                except socket.timeout:
+                    lost += len(chunk) - received
+                    waited += timeout_sec
+                    break
+                replay.process(data, time.perf_counter())
+                processed += 1
+    finally:
+        sender.close()
+        receiver.close()
+        replay.close()
+    # Time spent waiting out drops isn't processing time
+    elapsed = time.perf_counter() - start - waited
+
+    return {
+        "pipeline.loopback.throughput": {
+            "value": processed / elapsed, "unit": "packets/s", "better": "higher", "tolerance": 0.3,
+        },
+        "pipeline.loopback.lost": {
+            "value": lost, "unit": "packets", "better": "lower", "tolerance": 0.0,
+        },
+    }
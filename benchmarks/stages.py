@@ -0,0 +1,109 @@
+"""
+Micro-benchmarks for each stage of the listener's per-packet work.
+"""
+
+import itertools
+import json
+import timeit
+from collections import deque
+
+import udp_listener
+from instrumentation import ListenerStats
+from orientation import OrientationStore, normalize_quaternion
+
+# Payloads exactly as MainActivity.kt sends them
+PAYLOADS = {
+    "rotation_vector": (
+        b'{"sensor": "rotation_vector", "timestamp_ns": 5123456789012, '
+        b'"values": {"x": 0.01234567, "y": -0.02345678, "z": 0.70710677, "w": 0.70666444}}'
+    ),
+    "linear_acceleration": (
+        b'{"sensor": "linear_acceleration", "timestamp_ns": 5123456789012, '
+        b'"values": {"x": 0.3456789, "y": -1.2345678, "z": 2.3456788}}'
+    ),
+    "gyroscope": (
+        b'{"sensor": "gyroscope", "timestamp_ns": 5123456789012, '
+        b'"values": {"x": 0.012345678, "y": -0.023456789, "z": 0.5678901}}'
+    ),
+    "step_detector": b'{"sensor": "step_detector", "timestamp_ns": 5123456789012}',
+}
+
+QUATERNION = {"x": 0.01234567, "y": -0.02345678, "z": 0.70710677, "w": 0.70666444}
+ACCEL_VECTOR = [0.3456789, -1.2345678, 2.3456788]
+
+
+def time_per_op(func, repeats=7):
+    """
+    Time a zero-argument callable.
+
+    Returns:
+        float: Best-of-repeats time per call in nanoseconds
+    """
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeats, number=number)) / number * 1e9
+
+
+def _turn_window_case():
+    history = deque(maxlen=25)
+    for i in range(25):
+        history.append({"yaw": i * 0.5, "pitch": 1.0, "roll": -2.0})
+
+    def update():
+        history.append({"yaw": 10.0, "pitch": 1.0, "roll": -2.0})
+        udp_listener.is_stable_turn(history, 90.0)
+
+    return update
+
+
+def stage_cases():
+    """Returns {metric_name: zero-argument callable} for every hot-loop stage."""
+    cases = {}
+    for sensor, payload in PAYLOADS.items():
+        cases[f"stage.decode.{sensor}"] = lambda payload=payload: json.loads(payload.decode())
+
+    unit_quaternion = normalize_quaternion(**QUATERNION)
+    cases["stage.quaternion_to_euler"] = lambda: udp_listener.quaternion_to_euler(unit_quaternion)
+    cases["stage.rotate_vector_by_quaternion"] = (
+        lambda: udp_listener.rotate_vector_by_quaternion(ACCEL_VECTOR, QUATERNION)
+    )
+    store = OrientationStore()
+    store.add(1000, {"x": 0.0, "y": 0.0, "z": 0.0, "w": 1.0})
+    store.add(21000, QUATERNION)
+    arrivals = OrientationStore()
+    timestamps = itertools.count(0, 20_000_000)
+    cases["stage.orientation_add"] = lambda: arrivals.add(next(timestamps), QUATERNION)
+    # Usual case: the sample is newer than every stored orientation
+    cases["stage.orientation_rotate"] = lambda: store.rotate(ACCEL_VECTOR, 25000)
+    # Reordered packets: slerp between the two neighbours first
+    cases["stage.orientation_rotate_interpolated"] = lambda: store.rotate(ACCEL_VECTOR, 11000)
+    cases["stage.turn_window_update"] = _turn_window_case()
+    # The common case: an ordinary sample that triggers nothing
+    cases["stage.detect_action"] = (
+        lambda: udp_listener.detect_action(2.3, 1.3, 33.6, 35.1, 1.0)
+    )
+    # Paid several times per packet by the always-on counters
+    stats = ListenerStats()
+    cases["stage.instrumentation_lap"] = lambda: stats.lap("decode", 0)
+    cases["stage.format_dashboard"] = lambda: udp_listener.format_dashboard(
+        "right", "WALKING", 0.6, 1.0, 12.3, 8.7, 0.0
+    )
+    return cases
+
+
+def run_stage_benchmarks(repeats=7):
+    """
+    Returns:
+        dict: Metric name -> result entry (value, unit, better, tolerance)
+    """
+    results = {}
+    for name, func in stage_cases().items():
+        results[name] = {
+            "value": time_per_op(func, repeats),
+            "unit": "ns/op",
+            "better": "lower",
+            # Single calls are tens of nanoseconds to a few microseconds, so
+            # scheduler and frequency noise is proportionally large
+            "tolerance": 0.35,
+        }
+    return results
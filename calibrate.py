@@ -391,6 +391,13 @@ def calibrate_walking(config, sock):
     # Save the new fuel-based parameters
     config['thresholds']['fuel_added_per_step_sec'] = new_fuel_per_step
     config['thresholds']['max_fuel_sec'] = new_max_fuel
+    # Center the analog walk speed range on the player's natural pace
+    if "walk_speed" in config:
+        natural_steps_per_sec = 1.0 / avg_interval
+        config["walk_speed"]["slow_steps_per_sec"] = natural_steps_per_sec * 0.7
+        config["walk_speed"]["fast_steps_per_sec"] = natural_steps_per_sec * 1.4
+        print(f"Natural Cadence: {natural_steps_per_sec:.2f} steps/s "
+              f"(walk speed range {natural_steps_per_sec * 0.7:.2f}-{natural_steps_per_sec * 1.4:.2f})")
     # Remove the old keys if they still exist
     config['thresholds'].pop('walk_timeout_sec', None)
     config['thresholds'].pop('step_debounce_sec', None)
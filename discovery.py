@@ -0,0 +1,470 @@
+"""
+Zero-config discovery and session handshake between phones and the listener.
+
+Instead of typing the computer's IP into the app, a phone finds the listener
+on the local network and keeps a session with it, so a phone that drops off
+Wi-Fi (or changes IP) is streaming again within a few hundred milliseconds
+of getting back on, with no restart on either side.
+
+Protocol (version 1): JSON datagrams on the discovery port (default 12347),
+sent to the multicast group 239.255.77.77, to the LAN broadcast address, or
+straight to a known host. Every request gets a unicast reply.
+
+    phone -> {"type": "discover", "version": 1}
+    host  -> {"type": "announce", "version": 1, "host": "my-pc",
+              "address": "192.168.1.20", "addresses": [...], "port": 12345,
+              "formats": ["json"]}
+
+    phone -> {"type": "hello", "version": 1, "session": null | "<id>",
+              "nonce": "<random>", "device": "Pixel 7", "formats": ["json"]}
+    host  -> {"type": "welcome", "session": "<id>", "resumed": true | false,
+              "address": "192.168.1.20", "port": 12345, "format": "json",
+              "heartbeat_ms": 250}
+
+    phone -> {"type": "ping", "session": "<id>"}     every heartbeat_ms
+    host  -> {"type": "pong", "session": "<id>", "known": true | false}
+
+"address" is the host address that routes back to the asking phone, and
+sensor packets go to address:port exactly as before. A phone that misses two
+pongs sends hello with its old session id every heartbeat (multicast and
+broadcast included, in case the host's IP changed) until a welcome comes
+back with resumed = true. "known": false means the host restarted; the
+phone just says hello again. The nonce lets the host recognize one hello
+that arrived by several routes (multicast and broadcast) and answer it with
+a single session.
+
+Try it on one machine:
+    python discovery.py --find        # list listeners on the network
+    python discovery.py --selftest    # measure reconnect time over loopback
+"""
+
+import json
+import random
+import secrets
+import socket
+import struct
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import network_utils
+
+PROTOCOL_VERSION = 1
+WIRE_FORMATS = ["json"]
+DEFAULT_DISCOVERY_PORT = 12347
+DEFAULT_MULTICAST_GROUP = "239.255.77.77"
+
+
+def _route_address(peer_ip):
+    """The local address this computer would use to reach peer_ip (no traffic sent)."""
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            s.connect((peer_ip, 9))
+            return s.getsockname()[0]
+    except OSError:
+        return None
+
+
+class DiscoveryServer:
+    """Answers discovery, hello and ping messages from a background thread."""
+
+    def __init__(self, data_port, discovery_port=DEFAULT_DISCOVERY_PORT,
+                 multicast_group=DEFAULT_MULTICAST_GROUP, heartbeat_ms=250,
+                 session_timeout_sec=30.0, bind_ip=""):
+        self.data_port = data_port
+        self.heartbeat_ms = heartbeat_ms
+        self.session_timeout_sec = session_timeout_sec
+        # session id -> {"device", "address", "started", "last_seen", "resumes"}
+        self.sessions = {}
+        # Recent hello nonces -> welcome sent, to answer duplicates consistently
+        self.recent_hellos = OrderedDict()
+        # Lets tests simulate the host vanishing from the network
+        self.paused = False
+
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((bind_ip, discovery_port))
+        self.port = self.sock.getsockname()[1]
+
+        self.multicast = False
+        if multicast_group:
+            membership = struct.pack("4s4s", socket.inet_aton(multicast_group), socket.inet_aton("0.0.0.0"))
+            try:
+                self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+                self.multicast = True
+            except OSError as e:
+                # No multicast-capable interface; broadcast and unicast still work
+                print(f"Warning: Could not join multicast group {multicast_group}: {e}")
+
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def handle(self, message, addr):
+        """
+        Build the reply for one request.
+
+        Returns:
+            dict: Reply message, or None to stay silent
+        """
+        kind = message.get("type")
+        now = time.time()
+        self._expire(now)
+        address = _route_address(addr[0]) or addr[0]
+
+        if kind == "discover":
+            return {
+                "type": "announce",
+                "version": PROTOCOL_VERSION,
+                "host": socket.gethostname(),
+                "address": address,
+                "addresses": [ip for _, ip in network_utils.list_interface_ips()],
+                "port": self.data_port,
+                "formats": WIRE_FORMATS,
+            }
+
+        if kind == "hello":
+            requested = message.get("formats", WIRE_FORMATS)
+            nonce = message.get("nonce")
+            session_id = message.get("session")
+            device = message.get("device", "phone")
+            # Fields come off the network: anything of the wrong type is refused
+            if (
+                not isinstance(requested, list)
+                or not isinstance(nonce, (str, type(None)))
+                or not isinstance(session_id, (str, type(None)))
+                or not isinstance(device, str)
+            ):
+                return {"type": "error", "reason": "malformed hello"}
+            formats = [f for f in requested if isinstance(f, str) and f in WIRE_FORMATS]
+            if not formats:
+                return {"type": "error", "reason": f"no common wire format (host speaks {WIRE_FORMATS})"}
+            if nonce and nonce in self.recent_hellos:
+                # Same hello by another route: same answer
+                return self.recent_hellos[nonce]
+
+            session = self.sessions.get(session_id) if session_id else None
+            resumed = session is not None
+            if session is None:
+                # Keep the phone's id after a host restart so its logs stay continuous
+                session_id = session_id or secrets.token_hex(8)
+                session = self.sessions[session_id] = {
+                    "device": device[:64],
+                    "started": now,
+                    "resumes": 0,
+                }
+            else:
+                session["resumes"] += 1
+            session["address"] = addr[0]
+            session["last_seen"] = now
+            welcome = {
+                "type": "welcome",
+                "version": PROTOCOL_VERSION,
+                "session": session_id,
+                "resumed": resumed,
+                "address": address,
+                "port": self.data_port,
+                "format": formats[0],
+                "heartbeat_ms": self.heartbeat_ms,
+            }
+            if nonce:
+                self.recent_hellos[nonce] = welcome
+                if len(self.recent_hellos) > 256:
+                    self.recent_hellos.popitem(last=False)
+            return welcome
+
+        if kind == "ping":
+            session_id = message.get("session")
+            if not isinstance(session_id, str):
+                return {"type": "pong", "session": None, "known": False}
+            session = self.sessions.get(session_id)
+            if session is not None:
+                session["address"] = addr[0]
+                session["last_seen"] = now
+            return {"type": "pong", "session": session_id, "known": session is not None}
+
+        return None
+
+    def _expire(self, now):
+        expired = [
+            session_id for session_id, session in self.sessions.items()
+            if now - session["last_seen"] > self.session_timeout_sec
+        ]
+        for session_id in expired:
+            del self.sessions[session_id]
+
+    def _serve(self):
+        while True:
+            try:
+                data, addr = self.sock.recvfrom(2048)
+            except OSError:
+                # Socket closed at shutdown
+                return
+            if self.paused:
+                continue
+            try:
+                message = json.loads(data.decode())
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                continue
+            if not isinstance(message, dict):
+                continue
+            try:
+                reply = self.handle(message, addr)
+            except Exception as e:
+                # One bad message must never stop the server thread
+                print(f"\nWarning: Discovery request from {addr[0]} failed: {e}")
+                continue
+            if reply is not None:
+                try:
+                    self.sock.sendto(json.dumps(reply).encode(), addr)
+                except OSError:
+                    pass
+
+    def close(self):
+        self.sock.close()
+
+
+class DiscoveryClient:
+    """
+    The phone's side of the protocol (used by phone_simulator.py and the self-test).
+
+    Args:
+        device (str): Name reported to the host
+        hosts (list): Hosts to ask directly, in addition to multicast/broadcast
+        discovery_port (int): Host discovery port
+        multicast_group (str): Multicast group, or None to skip multicast
+        broadcast (bool): Also ask the LAN broadcast address
+    """
+
+    def __init__(self, device="phone", hosts=None, discovery_port=DEFAULT_DISCOVERY_PORT,
+                 multicast_group=DEFAULT_MULTICAST_GROUP, broadcast=True):
+        self.device = device
+        self.hosts = list(hosts or [])
+        self.discovery_port = discovery_port
+        self.multicast_group = multicast_group
+        self.broadcast = broadcast
+        self.session = None
+        self.welcome = None
+        self.host = None
+        self.connected = False
+        self.sock = self._new_socket()
+
+    def _new_socket(self):
+        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        s.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 1)
+        return s
+
+    def reset_socket(self):
+        """Start over on a new socket, as a phone does after rejoining Wi-Fi."""
+        self.sock.close()
+        self.sock = self._new_socket()
+
+    def _send_everywhere(self, message):
+        payload = json.dumps(message).encode()
+        targets = [(host, self.discovery_port) for host in self.hosts]
+        if self.host is not None and (self.host, self.discovery_port) not in targets:
+            targets.insert(0, (self.host, self.discovery_port))
+        if self.multicast_group:
+            targets.append((self.multicast_group, self.discovery_port))
+        if self.broadcast:
+            targets.append(("255.255.255.255", self.discovery_port))
+        for target in targets:
+            try:
+                self.sock.sendto(payload, target)
+            except OSError:
+                # e.g. no route for broadcast while Wi-Fi is down
+                pass
+
+    def _receive(self, wanted_type, timeout):
+        """Returns (message, addr) pairs of wanted_type until the timeout."""
+        deadline = time.perf_counter() + timeout
+        while True:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                return
+            self.sock.settimeout(remaining)
+            try:
+                data, addr = self.sock.recvfrom(4096)
+            except (socket.timeout, OSError):
+                return
+            try:
+                message = json.loads(data.decode())
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                continue
+            if isinstance(message, dict) and message.get("type") == wanted_type:
+                yield message, addr
+
+    def discover(self, timeout=0.5):
+        """
+        Returns:
+            list: Announce messages from every listener that answered
+        """
+        self._send_everywhere({"type": "discover", "version": PROTOCOL_VERSION})
+        found = {}
+        for message, _ in self._receive("announce", timeout):
+            # One host answers once per route; keep its LAN address over loopback
+            key = (message.get("host"), message.get("port"))
+            if key not in found or found[key]["address"].startswith("127."):
+                found[key] = message
+        return list(found.values())
+
+    def hello(self, timeout=0.25):
+        """
+        Open (or resume) a session.
+
+        Returns:
+            dict: The welcome message, or None if no host answered
+        """
+        self._send_everywhere({
+            "type": "hello",
+            "version": PROTOCOL_VERSION,
+            "session": self.session,
+            "nonce": secrets.token_hex(4),
+            "device": self.device,
+            "formats": WIRE_FORMATS,
+        })
+        for message, addr in self._receive("welcome", timeout):
+            self.session = message["session"]
+            self.welcome = message
+            self.host = addr[0]
+            self.connected = True
+            return message
+        return None
+
+    def ping(self, timeout=0.25):
+        """
+        Returns:
+            bool: True if the host answered and still knows the session
+        """
+        if self.host is None:
+            return False
+        try:
+            self.sock.sendto(
+                json.dumps({"type": "ping", "session": self.session}).encode(),
+                (self.host, self.discovery_port),
+            )
+        except OSError:
+            return False
+        for message, _ in self._receive("pong", timeout):
+            return message.get("known", False)
+        return False
+
+    def maintain(self, stop_event, on_welcome=None, missed_pings=2):
+        """
+        Keep the session alive until stop_event is set, resuming it after drops.
+
+        Args:
+            stop_event (threading.Event): Stops the loop
+            on_welcome (callable): Called with each welcome (new or resumed)
+            missed_pings (int): Lost pongs before the session counts as dropped
+        """
+        misses = 0
+        while not stop_event.is_set():
+            heartbeat = (self.welcome or {}).get("heartbeat_ms", 250) / 1000.0
+            started = time.perf_counter()
+            if self.connected:
+                if self.ping(timeout=heartbeat):
+                    misses = 0
+                else:
+                    misses += 1
+                    if misses >= missed_pings:
+                        self.connected = False
+            else:
+                welcome = self.hello(timeout=heartbeat)
+                if welcome is not None:
+                    misses = 0
+                    if on_welcome is not None:
+                        on_welcome(welcome)
+            # Pongs usually come back at once; keep a steady heartbeat
+            stop_event.wait(max(0.0, heartbeat - (time.perf_counter() - started)))
+
+    def close(self):
+        self.sock.close()
+
+
+def run_reconnect_test(heartbeat_ms=250, trials=8, seed=None):
+    """
+    Measure how fast a session comes back after the host vanishes, on loopback.
+
+    The server ignores every packet for 0.6-1.6s (as if Wi-Fi dropped),
+    then comes back; the time from its return to the client's resumed
+    welcome is the reconnect latency.
+
+    Returns:
+        list: Reconnect latency of each trial in milliseconds
+    """
+    server = DiscoveryServer(data_port=12345, discovery_port=0, heartbeat_ms=heartbeat_ms)
+    server.start()
+    client = DiscoveryClient("selftest", hosts=["127.0.0.1"], discovery_port=server.port,
+                             multicast_group=None, broadcast=False)
+    latencies = []
+    rng = random.Random(seed)
+    try:
+        if client.hello() is None:
+            print("ERROR: The discovery server did not answer on loopback")
+            return latencies
+
+        resumed = threading.Event()
+        stop_event = threading.Event()
+
+        def on_welcome(welcome):
+            if welcome["resumed"]:
+                resumed.set()
+
+        keeper = threading.Thread(target=client.maintain, args=(stop_event, on_welcome), daemon=True)
+        keeper.start()
+        for _ in range(trials):
+            time.sleep(heartbeat_ms / 1000.0 * 2)
+            resumed.clear()
+            server.paused = True
+            time.sleep(rng.uniform(0.6, 1.6))
+            back = time.perf_counter()
+            server.paused = False
+            if resumed.wait(timeout=5.0):
+                latencies.append((time.perf_counter() - back) * 1000.0)
+        stop_event.set()
+        keeper.join()
+    finally:
+        client.close()
+        server.close()
+    return latencies
+
+
+def main():
+    """
+    Command-line interface for discovery.
+    """
+    if len(sys.argv) > 1 and sys.argv[1] == "--find":
+        client = DiscoveryClient("discovery-cli", hosts=["127.0.0.1"])
+        listeners = client.discover(timeout=1.0)
+        client.close()
+        if not listeners:
+            print("No listeners found. Is udp_listener.py running with discovery enabled?")
+        for announce in listeners:
+            print(
+                f"{announce['host']}: {announce['address']}:{announce['port']} "
+                f"(formats: {', '.join(announce['formats'])}; "
+                f"all addresses: {', '.join(announce['addresses'])})"
+            )
+    elif len(sys.argv) > 1 and sys.argv[1] == "--selftest":
+        print("Simulating Wi-Fi drops of about a second on loopback...")
+        latencies = run_reconnect_test()
+        if not latencies:
+            print("FAIL: the session never resumed")
+            sys.exit(1)
+        print(
+            f"Resumed {len(latencies)} times: "
+            + ", ".join(f"{ms:.0f}ms" for ms in latencies)
+            + f" (worst {max(latencies):.0f}ms)"
+        )
+    else:
+        print("Usage:")
+        print("  python discovery.py --find        # List listeners on the network")
+        print("  python discovery.py --selftest    # Measure reconnect time over loopback")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Append-only structured log of detected gestures.
+
+The listener only appends records to an in-memory buffer; a background thread
+writes them to a JSON-lines file in batches, so disk I/O never happens while
+a packet is being processed.
+
+Each line looks like:
+    {"time": 1760000000.123, "sensor_time": 5123.456, "type": "jump",
+     "facing": "right", "world_z": 41.2, "peak_z": 41.2, "peak_xy": 8.3,
+     "thresholds": {"jump": 33.6, "attack": 35.1}}
+
+Summarize a log with:
+    python gesture_log.py [gestures.jsonl]
+"""
+
+import json
+import sys
+import threading
+from collections import deque
+
+
+class GestureLog:
+    """Buffers gesture records and flushes them to disk from its own thread."""
+
+    def __init__(self, path, flush_interval_sec=1.0, max_buffer=1000):
+        self.path = path
+        self.flush_interval_sec = flush_interval_sec
+        # Bounded so a stalled disk can't grow memory; the oldest records go first
+        self.buffer = deque(maxlen=max_buffer)
+        self.dropped = 0
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def record(self, gesture_type, timestamp, **fields):
+        """Queue one gesture. Cheap enough for the packet path: no I/O, no JSON."""
+        if len(self.buffer) == self.buffer.maxlen:
+            self.dropped += 1
+        self.buffer.append((gesture_type, timestamp, fields))
+
+    def flush(self):
+        """
+        Write everything buffered so far in one append.
+
+        Returns:
+            int: Number of records written
+        """
+        batch = []
+        while True:
+            try:
+                batch.append(self.buffer.popleft())
+            except IndexError:
+                break
+        if not batch:
+            return 0
+
+        lines = [
+            json.dumps({"time": timestamp, "type": gesture_type, **fields})
+            for gesture_type, timestamp, fields in batch
+        ]
+        try:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+        except OSError as e:
+            print(f"\nWarning: Could not write gesture log {self.path}: {e}")
+            self.dropped += len(batch)
+            return 0
+        return len(batch)
+
+    def _run(self):
+        while not self._stop_event.wait(self.flush_interval_sec):
+            self.flush()
+
+    def close(self):
+        self._stop_event.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self.flush()
+
+
+def summarize(path):
+    """
+    Count gestures by type and average their peaks.
+
+    Returns:
+        dict: type -> {"count", "mean_peak_z", "mean_peak_xy"}
+    """
+    summary = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            entry = summary.setdefault(
+                record["type"], {"count": 0, "peak_z": 0.0, "peak_xy": 0.0}
+            )
+            entry["count"] += 1
+            entry["peak_z"] += record.get("peak_z", 0.0)
+            entry["peak_xy"] += record.get("peak_xy", 0.0)
+
+    return {
+        gesture_type: {
+            "count": entry["count"],
+            "mean_peak_z": entry["peak_z"] / entry["count"],
+            "mean_peak_xy": entry["peak_xy"] / entry["count"],
+        }
+        for gesture_type, entry in summary.items()
+    }
+
+
+def main():
+    """
+    Command-line interface for summarizing a gesture log.
+    """
+    path = sys.argv[1] if len(sys.argv) > 1 else "gestures.jsonl"
+    try:
+        summary = summarize(path)
+    except FileNotFoundError:
+        print(f"No gesture log at {path}. Enable gesture_log in config.json first.")
+        return
+
+    print(f"{'gesture':<10} | {'count':>6} | {'mean peak Z':>11} | {'mean peak XY':>12}")
+    for gesture_type, entry in summary.items():
+        print(
+            f"{gesture_type:<10} | {entry['count']:6d} | "
+            f"{entry['mean_peak_z']:11.1f} | {entry['mean_peak_xy']:12.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,392 @@
+"""
+Runtime instrumentation for udp_listener.py.
+
+Always on (a few integer adds and perf_counter_ns calls per packet):
+- packets per sensor type, decode errors, actions fired
+- time spent in each stage of the loop
+
+On demand, without restarting the controller:
+- a cProfile capture of the listener loop for N seconds, written to disk
+- a counters report
+
+Trigger them by sending SIGUSR1 to the listener (Linux/Mac; profiles for the
+default duration), or through the local control port from another terminal:
+    python instrumentation.py profile 10
+    python instrumentation.py stats
+    python instrumentation.py reset
+
+Optionally, the same counters, latency histograms and live controller state
+are served in Prometheus text format at http://127.0.0.1:9105/metrics.
+"""
+
+import bisect
+import cProfile
+import io
+import json
+import math
+import os
+import pstats
+import signal
+import socket
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS_SEC = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025,
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+)
+_LATENCY_BUCKETS_NS = tuple(int(bound * 1e9) for bound in LATENCY_BUCKETS_SEC)
+
+# Sensor names the phone app sends; anything else is counted as "other".
+# Packets are untrusted, so their contents never become dict keys or labels.
+KNOWN_SENSORS = ("rotation_vector", "linear_acceleration", "gyroscope", "step_detector")
+
+
+class ListenerStats:
+    """Cheap counters updated from the listener loop."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.started = time.time()
+        self.packets = {}
+        self.decode_errors = 0
+        self.actions = {}
+        self.stage_ns = {}
+        self.stage_calls = {}
+        # name -> per-bucket counts (last slot is +Inf), sum in ns
+        self.histograms = {}
+        self.histogram_sum_ns = {}
+
+    def count_packet(self, sensor):
+        # A tuple, not a set: membership must not hash an unhashable value
+        if sensor not in KNOWN_SENSORS:
+            sensor = "other"
+        self.packets[sensor] = self.packets.get(sensor, 0) + 1
+
+    def count_error(self):
+        self.decode_errors += 1
+
+    def count_action(self, action):
+        self.actions[action] = self.actions.get(action, 0) + 1
+
+    def lap(self, stage, since_ns):
+        """Charge the time since since_ns to a stage; returns now for the next lap."""
+        now = time.perf_counter_ns()
+        self.stage_ns[stage] = self.stage_ns.get(stage, 0) + now - since_ns
+        self.stage_calls[stage] = self.stage_calls.get(stage, 0) + 1
+        return now
+
+    def observe(self, name, elapsed_ns):
+        """Add one latency sample to a histogram."""
+        counts = self.histograms.get(name)
+        if counts is None:
+            counts = self.histograms[name] = [0] * (len(_LATENCY_BUCKETS_NS) + 1)
+            self.histogram_sum_ns[name] = 0
+        counts[bisect.bisect_left(_LATENCY_BUCKETS_NS, elapsed_ns)] += 1
+        self.histogram_sum_ns[name] += elapsed_ns
+
+    def snapshot(self):
+        """Returns the counters as a JSON-serializable dict."""
+        # Called from other threads: copy first, the loop may add keys meanwhile
+        stage_ns = dict(self.stage_ns)
+        stage_calls = dict(self.stage_calls)
+        histograms = dict(self.histograms)
+        histogram_sum_ns = dict(self.histogram_sum_ns)
+        return {
+            "uptime_sec": time.time() - self.started,
+            "packets": dict(self.packets),
+            "decode_errors": self.decode_errors,
+            "actions": dict(self.actions),
+            "stages": {
+                stage: {
+                    "calls": stage_calls[stage],
+                    "total_ms": stage_ns[stage] / 1e6,
+                    "mean_us": stage_ns[stage] / stage_calls[stage] / 1e3,
+                }
+                for stage in stage_ns
+                if stage in stage_calls
+            },
+            "latency": {
+                name: {"buckets": list(counts), "sum_sec": histogram_sum_ns[name] / 1e9}
+                for name, counts in histograms.items()
+                if name in histogram_sum_ns
+            },
+        }
+
+    def format_report(self):
+        snapshot = self.snapshot()
+        lines = [f"--- Listener Stats ({snapshot['uptime_sec']:.0f}s) ---"]
+        total = sum(snapshot["packets"].values())
+        lines.append(f"Packets: {total} | Decode errors: {snapshot['decode_errors']}")
+        for sensor, count in sorted(snapshot["packets"].items()):
+            lines.append(f"  {sensor:<20} {count}")
+        actions = ", ".join(f"{name}={count}" for name, count in snapshot["actions"].items())
+        lines.append(f"Actions: {actions or 'none'}")
+        lines.append(f"{'stage':<20} | {'calls':>8} | {'mean us':>9} | {'total ms':>9}")
+        for stage, entry in snapshot["stages"].items():
+            lines.append(
+                f"{stage:<20} | {entry['calls']:8d} | "
+                f"{entry['mean_us']:9.1f} | {entry['total_ms']:9.1f}"
+            )
+        for name, histogram in snapshot["latency"].items():
+            count = sum(histogram["buckets"])
+            lines.append(
+                f"Latency ({name}): {count} samples, "
+                f"mean {histogram['sum_sec'] / count * 1e6:.1f} us"
+            )
+        return "\n".join(lines)
+
+
+def _metric(lines, name, kind, help_text, samples):
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} {kind}")
+    for labels, value in samples:
+        lines.append(f"{name}{labels} {value}")
+
+
+def render_prometheus(snapshot, state=None):
+    """
+    Format counters (and optional live state) in Prometheus text format.
+
+    Args:
+        snapshot (dict): ListenerStats.snapshot()
+        state (dict): Current controller state from the listener, or None
+
+    Returns:
+        str: The exposition text
+    """
+    lines = []
+    _metric(lines, "silksong_uptime_seconds", "gauge", "Seconds since the counters were reset.",
+            [("", f"{snapshot['uptime_sec']:.3f}")])
+    _metric(lines, "silksong_packets_total", "counter", "Packets received, by sensor type.",
+            [(f'{{sensor="{sensor}"}}', count) for sensor, count in snapshot["packets"].items()])
+    _metric(lines, "silksong_decode_errors_total", "counter", "Packets that could not be decoded.",
+            [("", snapshot["decode_errors"])])
+    _metric(lines, "silksong_actions_total", "counter", "Actions fired, by type.",
+            [(f'{{action="{action}"}}', count) for action, count in snapshot["actions"].items()])
+    _metric(lines, "silksong_stage_seconds_total", "counter", "Time spent in each listener stage.",
+            [(f'{{stage="{stage}"}}', f"{entry['total_ms'] / 1000:.6f}")
+             for stage, entry in snapshot["stages"].items()])
+    _metric(lines, "silksong_stage_calls_total", "counter", "Times each listener stage ran.",
+            [(f'{{stage="{stage}"}}', entry["calls"]) for stage, entry in snapshot["stages"].items()])
+
+    samples = []
+    for name, histogram in snapshot["latency"].items():
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS_SEC + ("+Inf",), histogram["buckets"]):
+            cumulative += count
+            samples.append((f'_bucket{{path="{name}",le="{bound}"}}', cumulative))
+        samples.append((f'_sum{{path="{name}"}}', f"{histogram['sum_sec']:.6f}"))
+        samples.append((f'_count{{path="{name}"}}', cumulative))
+    _metric(lines, "silksong_latency_seconds", "histogram",
+            "Time from packet arrival to the end of processing (path=packet) "
+            "or to the key press of a detected action (path=action).", samples)
+
+    if state is not None:
+        _metric(lines, "silksong_facing", "gauge", "Direction the character faces.",
+                [(f'{{direction="{direction}"}}', int(state["facing_direction"] == direction))
+                 for direction in ("left", "right")])
+        _metric(lines, "silksong_walking", "gauge", "1 while the walk key is held.",
+                [("", int(state["walking"]))])
+        _metric(lines, "silksong_walk_fuel_seconds", "gauge", "Remaining walk fuel.",
+                [("", f"{state['walk_fuel_seconds']:.3f}")])
+        _metric(lines, "silksong_peak_z_accel", "gauge", "Peak world Z acceleration since the last action.",
+                [("", f"{state['peak_z_accel']:.3f}")])
+        _metric(lines, "silksong_peak_xy_accel", "gauge", "Peak world XY acceleration since the last action.",
+                [("", f"{state['peak_xy_accel']:.3f}")])
+        _metric(lines, "silksong_threshold", "gauge", "Detection thresholds in effect.",
+                [(f'{{action="{action}"}}', f"{value:.3f}")
+                 for action, value in state["thresholds"].items()])
+    return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """Serves /metrics over HTTP from a background thread."""
+
+    def __init__(self, host, port, stats, state_func=None):
+        def render():
+            state = state_func() if state_func is not None else None
+            return render_prometheus(stats.snapshot(), state)
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # Request logs would scribble over the dashboard line
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class ProfileController:
+    """
+    Starts and stops cProfile inside the listener loop on request.
+
+    cProfile only sees the thread that enables it, so requests (from a signal
+    or the control thread) are just recorded; poll(), called once per packet
+    on the listener thread, does the actual start and stop.
+    """
+
+    def __init__(self, output_dir="profiles", default_seconds=10.0):
+        self.output_dir = output_dir
+        self.default_seconds = default_seconds
+        self.requested_seconds = None
+        self.profiler = None
+        self.stop_at = 0.0
+
+    def request(self, seconds=None):
+        if self.profiler is not None:
+            return "A profile is already running"
+        if seconds is None:
+            seconds = self.default_seconds
+        # nan or inf would never reach stop_at and profile until shutdown
+        if not math.isfinite(seconds) or seconds <= 0:
+            return f"Error: profile length must be a positive number of seconds, not {seconds:g}"
+        self.requested_seconds = seconds
+        return f"Profiling the next {self.requested_seconds:g}s of packets"
+
+    def poll(self):
+        if self.requested_seconds is not None:
+            self.stop_at = time.perf_counter() + self.requested_seconds
+            self.requested_seconds = None
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        elif self.profiler is not None and time.perf_counter() >= self.stop_at:
+            self.profiler.disable()
+            profiler, self.profiler = self.profiler, None
+            # Writing the files is slow; keep it off the packet loop
+            threading.Thread(target=self._write, args=(profiler,), daemon=True).start()
+
+    def stop(self):
+        """Finish a running profile immediately (used at shutdown)."""
+        if self.profiler is not None:
+            self.profiler.disable()
+            profiler, self.profiler = self.profiler, None
+            self._write(profiler)
+
+    def _write(self, profiler):
+        os.makedirs(self.output_dir, exist_ok=True)
+        base = os.path.join(self.output_dir, time.strftime("profile-%Y%m%d-%H%M%S"))
+        profiler.dump_stats(base + ".prof")
+
+        summary = io.StringIO()
+        pstats.Stats(profiler, stream=summary).sort_stats("cumulative").print_stats(30)
+        with open(base + ".txt", "w", encoding="utf-8") as f:
+            f.write(summary.getvalue())
+        print(f"\nProfile saved to {base}.prof (summary: {base}.txt)")
+
+
+def install_signal_handler(profile_controller):
+    """SIGUSR1 starts a profile of the default length (not available on Windows)."""
+    if not hasattr(signal, "SIGUSR1"):
+        return False
+    signal.signal(signal.SIGUSR1, lambda signum, frame: profile_controller.request())
+    return True
+
+
+class ControlServer:
+    """Answers text commands on a localhost UDP port from a background thread."""
+
+    def __init__(self, port, stats, profile_controller):
+        self.stats = stats
+        self.profile_controller = profile_controller
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        # Only local processes may control the listener
+        self.sock.bind(("127.0.0.1", port))
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def handle(self, command):
+        parts = command.strip().split()
+        if not parts:
+            return "Empty command"
+        if parts[0] == "profile":
+            seconds = float(parts[1]) if len(parts) > 1 else None
+            return self.profile_controller.request(seconds)
+        if parts[0] == "stats":
+            return self.stats.format_report()
+        if parts[0] == "stats-json":
+            return json.dumps(self.stats.snapshot())
+        if parts[0] == "reset":
+            self.stats.reset()
+            return "Counters reset"
+        return f"Unknown command '{parts[0]}' (try: profile [seconds], stats, stats-json, reset)"
+
+    def _serve(self):
+        while True:
+            try:
+                data, addr = self.sock.recvfrom(1024)
+            except OSError:
+                # Socket closed at shutdown
+                return
+            try:
+                reply = self.handle(data.decode(errors="replace"))
+            except ValueError as e:
+                reply = f"Error: {e}"
+            self.sock.sendto(reply.encode()[:65000], addr)
+
+    def close(self):
+        self.sock.close()
+
+
+def send_command(command, port, timeout=2.0):
+    """Send one control command to a running listener and return its reply."""
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        s.settimeout(timeout)
+        s.sendto(command.encode(), ("127.0.0.1", port))
+        data, _ = s.recvfrom(65535)
+        return data.decode()
+
+
+def main():
+    """
+    Command-line client for a running listener's control port.
+    """
+    if len(sys.argv) < 2:
+        print("Usage:")
+        print("  python instrumentation.py profile [seconds]   # Profile the listener loop")
+        print("  python instrumentation.py stats               # Show packet/stage counters")
+        print("  python instrumentation.py reset               # Reset the counters")
+        return
+
+    try:
+        with open("config.json", "r", encoding="utf-8") as f:
+            port = json.load(f).get("instrumentation", {}).get("control_port", 12346)
+    except (FileNotFoundError, json.JSONDecodeError):
+        port = 12346
+
+    try:
+        print(send_command(" ".join(sys.argv[1:]), port))
+    except socket.timeout:
+        print(f"No reply on control port {port}. Is udp_listener.py running?")
+    except ConnectionRefusedError:
+        print(f"Nothing listening on control port {port}. Is udp_listener.py running?")
+
+
+if __name__ == "__main__":
+    main()
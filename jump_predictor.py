@@ -0,0 +1,274 @@
+"""
+Predictive early jump.
+
+The plain detector presses jump once world Z acceleration passes the jump
+threshold, which is well into the hop. JumpPredictor watches the rising edge
+instead: when Z is climbing steeply (slope) and has already reached part of
+the threshold (partial magnitude), it presses jump right away. If Z then
+crosses the real threshold the jump is confirmed; if Z stops rising first
+or the confirm window runs out, the jump is cancelled and the key is
+released at once, so a false start costs only the smallest possible hop.
+A cancelled rise that goes on to cross the threshold after all (a noisy
+rising edge) still jumps, exactly when the plain detector would have.
+
+Aggressiveness (0-1) trades latency for false starts: higher values fire at
+a smaller fraction of the threshold and a gentler slope.
+
+Measure the trade-off on a replay (synthetic by default, or a session log
+recorded with the analysis pipeline's "log_packets" option):
+    python jump_predictor.py --evaluate
+    python jump_predictor.py --evaluate --recording session_log.jsonl
+"""
+
+import argparse
+import json
+import statistics
+
+from orientation import CLOCK_RESET_SEC, OrientationStore
+
+
+class JumpPredictor:
+    """Decides early jump presses from a stream of world-frame Z samples."""
+
+    def __init__(self, prediction_config):
+        aggressiveness = min(1.0, max(0.0, prediction_config.get("aggressiveness", 0.25)))
+        self.aggressiveness = aggressiveness
+        # Fraction of the jump threshold Z must reach before an early press:
+        # 0.9 at aggressiveness 0, 0.4 at aggressiveness 1
+        self.early_fraction = 0.9 - 0.5 * aggressiveness
+        # Rising slope needed, in m/s^3; walking bob is ~40, a hop ~1000
+        self.min_slope = prediction_config.get("min_slope", 300.0) * (1.5 - aggressiveness)
+        self.confirm_window_sec = prediction_config.get("confirm_window_sec", 0.1)
+        # Z must settle below this fraction of the threshold before the next jump
+        self.rearm_fraction = prediction_config.get("rearm_fraction", 0.3)
+
+        self.state = "armed"
+        self.fired_at = 0.0
+        self.last_z = 0.0
+        self.last_time = None
+
+        self.early = 0
+        self.confirmed = 0
+        self.cancelled = 0
+        self.late = 0
+
+    def update(self, world_z, sample_time, threshold):
+        """
+        Feed one sample.
+
+        Args:
+            world_z (float): World-frame vertical acceleration
+            sample_time (float): Sensor timestamp in seconds
+            threshold (float): Jump threshold currently in effect
+
+        Returns:
+            str: "early" (press now), "confirm" (early press was right),
+                 "cancel" (release now), "jump" (threshold crossed with no
+                 early press) or None
+        """
+        if self.last_time is not None and sample_time < self.last_time - CLOCK_RESET_SEC:
+            # New sensor clock: start over
+            self.state = "armed"
+            self.last_time = None
+        if self.last_time is not None and sample_time <= self.last_time:
+            # Duplicate or reordered sample: no usable slope
+            return None
+        slope = 0.0
+        if self.last_time is not None:
+            slope = (world_z - self.last_z) / (sample_time - self.last_time)
+        self.last_z = world_z
+        self.last_time = sample_time
+        early_level = threshold * self.early_fraction
+
+        if self.state == "armed":
+            if world_z > threshold:
+                self.state = "fired"
+                self.late += 1
+                return "jump"
+            if world_z > early_level and slope > self.min_slope:
+                self.state = "pending"
+                self.fired_at = sample_time
+                self.early += 1
+                return "early"
+            return None
+
+        if self.state == "pending":
+            if world_z > threshold:
+                self.state = "fired"
+                self.confirmed += 1
+                return "confirm"
+            if slope <= 0.0 or sample_time - self.fired_at > self.confirm_window_sec:
+                # Stopped rising below the threshold: probably not a jump
+                self.state = "cancelled"
+                self.cancelled += 1
+                return "cancel"
+            return None
+
+        if self.state == "cancelled":
+            # No second early press for the same rise, but if it was a jump
+            # after all, never do worse than the plain detector
+            if world_z > threshold:
+                self.state = "fired"
+                self.late += 1
+                return "jump"
+            if world_z < threshold * self.rearm_fraction:
+                self.state = "armed"
+            return None
+
+        # "fired": wait for the motion to settle before arming again
+        if world_z < threshold * self.rearm_fraction:
+            self.state = "armed"
+        return None
+
+
+# --- Replay evaluation ---
+# Real jumps of different strengths, bounces that rise fast but stay under
+# the threshold (the predictor's false-start bait), and real jumps whose rise
+# stalls partway up (bait for cancelling a jump that is real)
+EVALUATION_SCRIPT = (
+    "idle:0.5,hop:45,walk:2:2,hop:38,idle:0.3,hop:28,punch,idle:0.3,"
+    "hop:52,walk:2:2.5,hop:22,idle:0.3,hop:36,turn:180,hop:31,idle:0.5,"
+    "hop:45:0.1,idle:0.53,hop:40:0.15,idle:0.51,hop:50:0.1,idle:0.5"
+)
+
+
+def world_z_samples(packets):
+    """Returns (sensor_time, world_z) for every linear_acceleration packet."""
+    store = OrientationStore()
+    samples = []
+    for data in packets:
+        try:
+            parsed_json = json.loads(data.decode())
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            continue
+        sensor_type = parsed_json.get("sensor")
+        if sensor_type == "rotation_vector":
+            store.add(parsed_json["timestamp_ns"], parsed_json["values"])
+        elif sensor_type == "linear_acceleration":
+            vals = parsed_json["values"]
+            _, _, world_z = store.rotate((vals["x"], vals["y"], vals["z"]), parsed_json["timestamp_ns"])
+            samples.append((parsed_json["timestamp_ns"] / 1e9, world_z))
+    samples.sort()
+    return samples
+
+
+def evaluate(samples, threshold, aggressiveness, prediction_config=None):
+    """
+    Replay samples through the predictor and compare with the plain detector.
+
+    The plain detector presses when Z passes the threshold (with the same
+    re-arm rule, so each hop counts once); each of its jumps is matched to the
+    predictor's press for the same hop.
+
+    Returns:
+        dict: jumps, early/confirmed/cancelled/late counts, missed jumps and
+              latency gained per jump and key hold of each false start,
+              both in milliseconds
+    """
+    config = dict(prediction_config or {})
+    config["aggressiveness"] = aggressiveness
+    predictor = JumpPredictor(config)
+
+    baseline_armed = True
+    baseline_jumps = []
+    predicted_presses = []
+    false_start_holds = []
+    pending_press = None
+    for sample_time, world_z in samples:
+        if baseline_armed and world_z > threshold:
+            baseline_jumps.append(sample_time)
+            baseline_armed = False
+        elif not baseline_armed and world_z < threshold * predictor.rearm_fraction:
+            baseline_armed = True
+
+        event = predictor.update(world_z, sample_time, threshold)
+        if event == "early":
+            pending_press = sample_time
+        elif event == "confirm":
+            predicted_presses.append(pending_press)
+        elif event == "cancel":
+            false_start_holds.append((sample_time - pending_press) * 1000.0)
+        elif event == "jump":
+            predicted_presses.append(sample_time)
+
+    gains = []
+    missed = 0
+    presses = sorted(predicted_presses)
+    for jump_time in baseline_jumps:
+        # The predictor's press for this hop is the latest one at or before it
+        candidates = [t for t in presses if jump_time - 0.5 <= t <= jump_time]
+        if candidates:
+            gains.append((jump_time - candidates[-1]) * 1000.0)
+        else:
+            missed += 1
+
+    return {
+        "jumps": len(baseline_jumps),
+        "early": predictor.early,
+        "confirmed": predictor.confirmed,
+        "cancelled": predictor.cancelled,
+        "late": predictor.late,
+        "missed": missed,
+        "gains_ms": gains,
+        "false_start_holds_ms": false_start_holds,
+    }
+
+
+def main():
+    """
+    Command-line interface for evaluating jump prediction on a replay.
+    """
+    parser = argparse.ArgumentParser(description="Measure predictive jump latency vs. false starts.")
+    parser.add_argument("--evaluate", action="store_true", help="Run the replay evaluation")
+    parser.add_argument("--recording", help="Session log with recorded packets (default: synthetic)")
+    parser.add_argument("--levels", default="0,0.25,0.5,0.75,1", help="Aggressiveness levels to compare")
+    parser.add_argument("--rate", type=float, default=50.0, help="Synthetic sensor rate in Hz")
+    parser.add_argument("--repeat", type=int, default=10, help="Synthetic script repetitions")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    if not args.evaluate:
+        parser.print_help()
+        return
+
+    try:
+        with open("config.json", "r", encoding="utf-8") as f:
+            config = json.load(f)
+        threshold = config["thresholds"]["jump_threshold_z_accel"]
+        prediction_config = config.get("jump_prediction", {})
+    except (FileNotFoundError, json.JSONDecodeError, KeyError):
+        threshold, prediction_config = 33.6, {}
+
+    if args.recording:
+        from benchmarks.pipeline import recorded_stream
+
+        packets = recorded_stream(args.recording)
+        source = args.recording
+    else:
+        from phone_simulator import MotionModel, VirtualPhone, parse_script
+
+        motion = MotionModel(parse_script(EVALUATION_SCRIPT, args.repeat))
+        phone = VirtualPhone(0, motion, rate_hz=args.rate, noise=0.3, seed=args.seed)
+        packets = [payload for _, payload in phone.packets()]
+        source = f"synthetic, {args.rate:.0f} Hz"
+
+    samples = world_z_samples(packets)
+    print(f"Replaying {len(samples)} acceleration samples ({source}), jump threshold {threshold:.1f}")
+    print(
+        f"{'aggr.':>5} | {'jumps':>5} | {'confirmed':>9} | {'false starts':>12} | "
+        f"{'missed':>6} | {'mean gain':>9} | {'p50 gain':>8} | {'false hold':>10}"
+    )
+    for level in (float(x) for x in args.levels.split(",")):
+        result = evaluate(samples, threshold, level, prediction_config)
+        gains = result["gains_ms"] or [0.0]
+        holds = result["false_start_holds_ms"] or [0.0]
+        print(
+            f"{level:5.2f} | {result['jumps']:5d} | {result['confirmed']:9d} | "
+            f"{result['cancelled']:12d} | {result['missed']:6d} | "
+            f"{statistics.mean(gains):7.1f}ms | {statistics.median(gains):6.1f}ms | "
+            f"{statistics.mean(holds):8.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -4,8 +4,59 @@ Network utilities for automatic IP address detection and configuration managemen
 
 import socket
 import json
+import struct
 import sys
 
+# ioctl number for reading an interface's IPv4 address on Linux
+SIOCGIFADDR = 0x8915
+
+
+def list_interface_ips():
+    """
+    List this computer's IPv4 addresses without needing internet access.
+
+    Returns:
+        list: (interface_name, ip) pairs, loopback excluded
+    """
+    addresses = []
+    if sys.platform.startswith("linux"):
+        import fcntl
+
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            for _, name in socket.if_nameindex():
+                try:
+                    packed = fcntl.ioctl(
+                        s.fileno(), SIOCGIFADDR, struct.pack("256s", name.encode()[:15])
+                    )
+                except OSError:
+                    # Interface is down or has no IPv4 address
+                    continue
+                addresses.append((name, socket.inet_ntoa(packed[20:24])))
+    else:
+        # Windows/Mac: whatever the hostname resolves to locally
+        try:
+            infos = socket.getaddrinfo(socket.gethostname(), None, socket.AF_INET)
+        except socket.gaierror:
+            infos = []
+        for info in infos:
+            ip = info[4][0]
+            if ("", ip) not in addresses:
+                addresses.append(("", ip))
+
+    return [(name, ip) for name, ip in addresses if not ip.startswith("127.")]
+
+
+def _lan_preference(ip):
+    # Home Wi-Fi is almost always 192.168.x.x, then 10.x, then 172.16-31.x
+    if ip.startswith("192.168."):
+        return 0
+    if ip.startswith("10."):
+        return 1
+    second = int(ip.split(".")[1])
+    if ip.startswith("172.") and 16 <= second <= 31:
+        return 2
+    return 3
+
 
 def get_local_ip():
     """
@@ -22,6 +73,13 @@ def get_local_ip():
             local_ip = s.getsockname()[0]
             return local_ip
     except Exception as e:
+        # No default route (e.g. a hotspot or router without internet):
+        # pick the most LAN-looking interface instead
+        candidates = sorted(list_interface_ips(), key=lambda item: _lan_preference(item[1]))
+        if candidates:
+            name, ip = candidates[0]
+            print(f"Note: No internet route ({e}); using interface {name or ip}")
+            return ip
         print(f"Warning: Could not auto-detect IP address: {e}")
         print("Falling back to localhost")
         return "127.0.0.1"
@@ -109,6 +167,9 @@ def main():
         if sys.argv[1] == "--detect":
             ip = get_local_ip()
             print(f"Detected IP: {ip}")
+        elif sys.argv[1] == "--interfaces":
+            for name, ip in list_interface_ips():
+                print(f"{name:<12} {ip}")
         elif sys.argv[1] == "--update":
             update_config_ip()
         elif sys.argv[1] == "--set" and len(sys.argv) > 2:
@@ -117,6 +178,7 @@ def main():
         else:
             print("Usage:")
             print("  python network_utils.py --detect     # Show detected IP")
+            print("  python network_utils.py --interfaces # List all interface addresses")
             print("  python network_utils.py --update     # Auto-update config.json")
             print("  python network_utils.py --set <IP>   # Set specific IP in config.json")
     else:
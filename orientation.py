@@ -0,0 +1,176 @@
+"""
+Timestamp-aligned phone orientation for world-frame acceleration.
+
+rotation_vector and linear_acceleration arrive as separate packets, at their
+own rates and sometimes out of order, so "the last quaternion received" is
+usually a few milliseconds off from any given acceleration sample.
+OrientationStore keeps the recent quaternions sorted by sensor timestamp,
+with each one's rotation matrix computed once on arrival. An acceleration
+sample is rotated with the matrix of the orientation at its own timestamp,
+slerped between the two nearest quaternions, and applying it is a single
+3x3 matrix-vector product.
+
+Samples newer than the latest quaternion use the latest matrix as-is
+(the common case, and free); nothing is extrapolated.
+
+A quaternion more than CLOCK_RESET_NS older than the newest one is not a
+late packet but a new sensor clock (the phone rebooted, a different phone
+connected, or the simulator restarted), so the store starts over.
+"""
+
+import bisect
+import math
+
+IDENTITY = (1.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 1.0)
+# Packets arrive at most a few tens of ms out of order, so sensor time going
+# back further than this is a new clock (phone reboot, different phone).
+# Every module that follows sensor time imports it from here.
+CLOCK_RESET_SEC = 1.0
+CLOCK_RESET_NS = int(CLOCK_RESET_SEC * 1e9)
+
+
+def normalize_quaternion(x, y, z, w):
+    """
+    Returns a unit quaternion as an (x, y, z, w) tuple.
+
+    Some phones report only x, y, z (the app sends w = 0 then); like Android's
+    SensorManager.getQuaternionFromVector, w is rebuilt from the unit length.
+    """
+    if w == 0.0:
+        w = math.sqrt(max(0.0, 1.0 - (x * x + y * y + z * z)))
+    norm = math.sqrt(x * x + y * y + z * z + w * w)
+    if norm == 0.0:
+        return (0.0, 0.0, 0.0, 1.0)
+    return (x / norm, y / norm, z / norm, w / norm)
+
+
+def quaternion_to_matrix(q):
+    """Row-major 3x3 rotation matrix (as a flat 9-tuple) for a unit quaternion."""
+    x, y, z, w = q
+    xx, yy, zz = x * x, y * y, z * z
+    xy, xz, yz = x * y, x * z, y * z
+    wx, wy, wz = w * x, w * y, w * z
+    return (
+        1.0 - 2.0 * (yy + zz), 2.0 * (xy - wz), 2.0 * (xz + wy),
+        2.0 * (xy + wz), 1.0 - 2.0 * (xx + zz), 2.0 * (yz - wx),
+        2.0 * (xz - wy), 2.0 * (yz + wx), 1.0 - 2.0 * (xx + yy),
+    )
+
+
+def slerp(q0, q1, t):
+    """Spherical linear interpolation between unit quaternions, 0 <= t <= 1."""
+    dot = q0[0] * q1[0] + q0[1] * q1[1] + q0[2] * q1[2] + q0[3] * q1[3]
+    # q and -q are the same rotation; take the short way round
+    if dot < 0.0:
+        q1 = (-q1[0], -q1[1], -q1[2], -q1[3])
+        dot = -dot
+
+    if dot > 0.9995:
+        # Nearly identical: normalized lerp is accurate and avoids dividing by ~0
+        result = tuple(a + t * (b - a) for a, b in zip(q0, q1))
+        norm = math.sqrt(sum(c * c for c in result))
+        return tuple(c / norm for c in result)
+
+    theta = math.acos(dot)
+    sin_theta = math.sin(theta)
+    s0 = math.sin((1.0 - t) * theta) / sin_theta
+    s1 = math.sin(t * theta) / sin_theta
+    return tuple(s0 * a + s1 * b for a, b in zip(q0, q1))
+
+
+def apply_matrix(m, vector):
+    """Rotate one (x, y, z) vector by a flat 3x3 matrix."""
+    x, y, z = vector
+    return (
+        m[0] * x + m[1] * y + m[2] * z,
+        m[3] * x + m[4] * y + m[5] * z,
+        m[6] * x + m[7] * y + m[8] * z,
+    )
+
+
+class OrientationStore:
+    """Recent orientations, sorted by sensor time, with cached rotation matrices."""
+
+    def __init__(self, history=16):
+        self.history = history
+        self.timestamps = []
+        self.quaternions = []
+        self.matrices = []
+        self.out_of_order = 0
+        self.clock_resets = 0
+
+    def add(self, timestamp_ns, values):
+        """
+        Store one rotation_vector sample.
+
+        Args:
+            timestamp_ns (int): Sensor timestamp of the sample
+            values (dict): The packet's "values" (x, y, z, w)
+
+        Returns:
+            tuple: The normalized (x, y, z, w) quaternion
+        """
+        q = normalize_quaternion(values["x"], values["y"], values["z"], values.get("w", 0.0))
+        matrix = quaternion_to_matrix(q)
+
+        if self.timestamps and timestamp_ns < self.timestamps[-1] - CLOCK_RESET_NS:
+            # A new sensor clock: everything stored belongs to the old one
+            self.clock_resets += 1
+            self.timestamps.clear()
+            self.quaternions.clear()
+            self.matrices.clear()
+
+        if not self.timestamps or timestamp_ns > self.timestamps[-1]:
+            self.timestamps.append(timestamp_ns)
+            self.quaternions.append(q)
+            self.matrices.append(matrix)
+        else:
+            # Late packet: slot it into place so interpolation stays correct
+            self.out_of_order += 1
+            i = bisect.bisect_left(self.timestamps, timestamp_ns)
+            if i < len(self.timestamps) and self.timestamps[i] == timestamp_ns:
+                self.quaternions[i] = q
+                self.matrices[i] = matrix
+                return q
+            self.timestamps.insert(i, timestamp_ns)
+            self.quaternions.insert(i, q)
+            self.matrices.insert(i, matrix)
+
+        if len(self.timestamps) > self.history:
+            del self.timestamps[0], self.quaternions[0], self.matrices[0]
+        return q
+
+    def matrix_at(self, timestamp_ns):
+        """Rotation matrix of the phone at a sensor timestamp."""
+        timestamps = self.timestamps
+        if not timestamps:
+            return IDENTITY
+        # Fast path: sample is at or after the newest orientation
+        if timestamp_ns >= timestamps[-1]:
+            return self.matrices[-1]
+        if timestamp_ns <= timestamps[0]:
+            return self.matrices[0]
+
+        i = bisect.bisect_right(timestamps, timestamp_ns)
+        t0, t1 = timestamps[i - 1], timestamps[i]
+        if timestamp_ns == t0:
+            return self.matrices[i - 1]
+        fraction = (timestamp_ns - t0) / (t1 - t0)
+        return quaternion_to_matrix(slerp(self.quaternions[i - 1], self.quaternions[i], fraction))
+
+    def rotate(self, vector, timestamp_ns):
+        """Device-frame (x, y, z) vector -> world frame at the sample's own time."""
+        return apply_matrix(self.matrix_at(timestamp_ns), vector)
+
+    def rotate_batch(self, samples):
+        """
+        Rotate several samples, e.g. every acceleration sample of one frame.
+
+        Args:
+            samples (list): (timestamp_ns, (x, y, z)) pairs
+
+        Returns:
+            list: World-frame (x, y, z) tuples in the same order
+        """
+        matrix_at = self.matrix_at
+        return [apply_matrix(matrix_at(timestamp_ns), vector) for timestamp_ns, vector in samples]
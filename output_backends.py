@@ -0,0 +1,370 @@
+"""
+Output backends: how detected gestures become input the game can see.
+
+The listener only speaks in actions ("left", "right", "jump", "attack", plus
+"down" and "dash" when combos use them) and hands them to a backend:
+
+- PynputBackend:    synthesized OS keyboard events (the original behaviour)
+- UinputBackend:    a Linux /dev/uinput virtual keyboard or gamepad; events go
+                    straight into the kernel input layer, works on Wayland and
+                    headless sessions, and the gamepad mode has an analog stick
+- NullBackend:      discards everything (for benchmarks)
+- RecordingBackend: keeps a timestamped log of every event (for benchmarks)
+
+Run `python output_backends.py --latency` to compare backends on this machine.
+"""
+
+import os
+import statistics
+import struct
+import sys
+import time
+
+ACTIONS = ("left", "right", "jump", "attack")
+# Only needed by combos (see action_scheduler.py); mapped if keyboard_mappings has them
+OPTIONAL_ACTIONS = ("down", "dash")
+
+
+def mapped_actions(key_mappings):
+    """The required actions plus any optional ones that have a key."""
+    return ACTIONS + tuple(action for action in OPTIONAL_ACTIONS if action in key_mappings)
+
+
+class OutputBackend:
+    """Base class. Subclasses implement press/release; analog output is optional."""
+
+    name = "base"
+    # True if set_walk_axis() produces a real analog value
+    supports_analog = False
+
+    def press(self, action):
+        raise NotImplementedError
+
+    def release(self, action):
+        raise NotImplementedError
+
+    def set_walk_axis(self, value):
+        """Horizontal movement in [-1.0, 1.0]. Ignored by keyboard-only backends."""
+
+    def close(self):
+        """Release anything still held and free OS resources."""
+
+
+# --- pynput ---
+def get_key(key_string):
+    """Converts a string from config to a pynput Key object if needed."""
+    from pynput.keyboard import Key
+
+    if key_string.startswith("Key."):
+        key_name = key_string.split(".")[-1]
+        if hasattr(Key, key_name):
+            return getattr(Key, key_name)
+    return key_string
+
+
+class PynputBackend(OutputBackend):
+    """Keyboard events synthesized through pynput (X11, macOS, Windows)."""
+
+    name = "pynput"
+
+    def __init__(self, key_mappings):
+        # Imported here so other backends work where pynput can't load
+        from pynput.keyboard import Controller
+
+        self.keyboard = Controller()
+        self.keys = {action: get_key(key_mappings[action]) for action in mapped_actions(key_mappings)}
+
+    def press(self, action):
+        self.keyboard.press(self.keys[action])
+
+    def release(self, action):
+        self.keyboard.release(self.keys[action])
+
+
+# --- Linux uinput ---
+# Constants from <linux/input-event-codes.h> and <linux/uinput.h>
+EV_SYN = 0x00
+EV_KEY = 0x01
+EV_ABS = 0x03
+SYN_REPORT = 0
+ABS_X = 0x00
+ABS_Y = 0x01
+BTN_SOUTH = 0x130
+BTN_EAST = 0x131
+BTN_WEST = 0x134
+BTN_TR2 = 0x139
+BTN_START = 0x13B
+
+UI_DEV_CREATE = 0x5501
+UI_DEV_DESTROY = 0x5502
+UI_SET_EVBIT = 0x40045564
+UI_SET_KEYBIT = 0x40045565
+UI_SET_ABSBIT = 0x40045567
+
+BUS_VIRTUAL = 0x06
+ABS_AXIS_MAX = 32767
+
+# struct input_event: struct timeval, __u16 type, __u16 code, __s32 value
+INPUT_EVENT = struct.Struct("llHHi")
+# struct uinput_user_dev: name, input_id, ff_effects_max, absmax/min/fuzz/flat
+UINPUT_USER_DEV = struct.Struct("80sHHHHi64i64i64i64i")
+
+LINUX_KEYCODES = {
+    "Key.esc": 1, "Key.backspace": 14, "Key.tab": 15, "Key.enter": 28,
+    "Key.ctrl": 29, "Key.ctrl_l": 29, "Key.shift": 42, "Key.shift_l": 42,
+    "Key.shift_r": 54, "Key.alt": 56, "Key.alt_l": 56, "Key.space": 57,
+    "Key.up": 103, "Key.left": 105, "Key.right": 106, "Key.down": 108,
+    "1": 2, "2": 3, "3": 4, "4": 5, "5": 6, "6": 7, "7": 8, "8": 9, "9": 10, "0": 11,
+    "q": 16, "w": 17, "e": 18, "r": 19, "t": 20, "y": 21, "u": 22, "i": 23,
+    "o": 24, "p": 25, "a": 30, "s": 31, "d": 32, "f": 33, "g": 34, "h": 35,
+    "j": 36, "k": 37, "l": 38, "z": 44, "x": 45, "c": 46, "v": 47, "b": 48,
+    "n": 49, "m": 50, " ": 57,
+}
+
+# Standard gamepad layout: A jumps, X attacks (Hollow Knight's defaults),
+# right trigger dashes; "down" pushes the left stick down
+GAMEPAD_BUTTONS = {"jump": BTN_SOUTH, "attack": BTN_WEST, "dash": BTN_TR2}
+
+
+class UinputBackend(OutputBackend):
+    """
+    A virtual input device created through /dev/uinput (Linux only).
+
+    mode="keyboard" presses the same keys as config.json's keyboard_mappings.
+    mode="gamepad" exposes buttons plus an analog left stick, whose X axis
+    lets walking speed be continuous instead of on/off.
+
+    Needs write access to /dev/uinput (root, or a udev rule for the input group).
+    """
+
+    name = "uinput"
+
+    def __init__(self, key_mappings, mode="keyboard", device_name="Silksong Motion Controller"):
+        import fcntl
+
+        self.mode = mode
+        self.supports_analog = mode == "gamepad"
+        self.fd = os.open("/dev/uinput", os.O_WRONLY | os.O_NONBLOCK)
+
+        try:
+            if mode == "gamepad":
+                self.codes = dict(GAMEPAD_BUTTONS)
+                buttons = list(GAMEPAD_BUTTONS.values()) + [BTN_EAST, BTN_START]
+                fcntl.ioctl(self.fd, UI_SET_EVBIT, EV_KEY)
+                for button in buttons:
+                    fcntl.ioctl(self.fd, UI_SET_KEYBIT, button)
+                fcntl.ioctl(self.fd, UI_SET_EVBIT, EV_ABS)
+                fcntl.ioctl(self.fd, UI_SET_ABSBIT, ABS_X)
+                fcntl.ioctl(self.fd, UI_SET_ABSBIT, ABS_Y)
+            else:
+                self.codes = {}
+                for action in mapped_actions(key_mappings):
+                    key_string = key_mappings[action]
+                    if key_string not in LINUX_KEYCODES:
+                        raise ValueError(f"No Linux keycode known for '{key_string}'")
+                    self.codes[action] = LINUX_KEYCODES[key_string]
+                fcntl.ioctl(self.fd, UI_SET_EVBIT, EV_KEY)
+                for code in self.codes.values():
+                    fcntl.ioctl(self.fd, UI_SET_KEYBIT, code)
+
+            absmax = [0] * 64
+            absmin = [0] * 64
+            if mode == "gamepad":
+                for axis in (ABS_X, ABS_Y):
+                    absmax[axis] = ABS_AXIS_MAX
+                    absmin[axis] = -ABS_AXIS_MAX
+            os.write(
+                self.fd,
+                UINPUT_USER_DEV.pack(
+                    device_name.encode()[:79], BUS_VIRTUAL, 0x1234, 0x5678, 1, 0,
+                    *absmax, *absmin, *([0] * 64), *([0] * 64),
+                ),
+            )
+            fcntl.ioctl(self.fd, UI_DEV_CREATE)
+        except Exception:
+            os.close(self.fd)
+            raise
+
+        # In gamepad mode left/right move the stick rather than press buttons
+        self.axis_value = 0.0
+        self.held = set()
+
+    def _emit(self, event_type, code, value):
+        now = time.time()
+        seconds = int(now)
+        os.write(
+            self.fd,
+            INPUT_EVENT.pack(seconds, int((now - seconds) * 1e6), event_type, code, value)
+            + INPUT_EVENT.pack(seconds, int((now - seconds) * 1e6), EV_SYN, SYN_REPORT, 0),
+        )
+
+    def press(self, action):
+        if self.mode == "gamepad" and action in ("left", "right"):
+            self.set_walk_axis(-1.0 if action == "left" else 1.0)
+            return
+        if self.mode == "gamepad" and action == "down":
+            # Positive Y is down on Linux gamepads
+            self._emit(EV_ABS, ABS_Y, ABS_AXIS_MAX)
+            self.held.add(action)
+            return
+        self.held.add(action)
+        self._emit(EV_KEY, self.codes[action], 1)
+
+    def release(self, action):
+        if self.mode == "gamepad" and action in ("left", "right"):
+            self.set_walk_axis(0.0)
+            return
+        if self.mode == "gamepad" and action == "down":
+            self._emit(EV_ABS, ABS_Y, 0)
+            self.held.discard(action)
+            return
+        self.held.discard(action)
+        self._emit(EV_KEY, self.codes[action], 0)
+
+    def set_walk_axis(self, value):
+        if not self.supports_analog:
+            return
+        value = max(-1.0, min(1.0, value))
+        if value != self.axis_value:
+            self.axis_value = value
+            self._emit(EV_ABS, ABS_X, int(value * ABS_AXIS_MAX))
+
+    def close(self):
+        import fcntl
+
+        for action in list(self.held):
+            self.release(action)
+        self.set_walk_axis(0.0)
+        fcntl.ioctl(self.fd, UI_DEV_DESTROY)
+        os.close(self.fd)
+
+
+# --- Benchmark sinks ---
+class NullBackend(OutputBackend):
+    """Accepts and discards every event."""
+
+    name = "null"
+    supports_analog = True
+
+    def press(self, action):
+        pass
+
+    def release(self, action):
+        pass
+
+
+class RecordingBackend(OutputBackend):
+    """Keeps (perf_counter_ns, kind, action, value) for every event emitted."""
+
+    name = "recording"
+    supports_analog = True
+
+    def __init__(self):
+        self.events = []
+
+    def press(self, action):
+        self.events.append((time.perf_counter_ns(), "press", action, 1.0))
+
+    def release(self, action):
+        self.events.append((time.perf_counter_ns(), "release", action, 0.0))
+
+    def set_walk_axis(self, value):
+        self.events.append((time.perf_counter_ns(), "axis", "walk", value))
+
+
+def create_backend(config):
+    """
+    Build the backend selected in config.json.
+
+    Args:
+        config (dict): The full configuration
+
+    Returns:
+        OutputBackend: The ready-to-use backend
+    """
+    output_config = config.get("output", {})
+    backend = output_config.get("backend", "pynput")
+    key_mappings = config["keyboard_mappings"]
+
+    if backend == "pynput":
+        return PynputBackend(key_mappings)
+    if backend == "uinput":
+        return UinputBackend(key_mappings, output_config.get("uinput_mode", "keyboard"))
+    if backend == "null":
+        return NullBackend()
+    if backend == "recording":
+        return RecordingBackend()
+    raise ValueError(f"Unknown output backend '{backend}'")
+
+
+# --- Latency Comparison ---
+def measure_latency(backend, samples=500):
+    """
+    Time how long each backend call takes to hand an event to the OS.
+
+    Returns:
+        list: Per-event latencies in microseconds
+    """
+    latencies = []
+    for i in range(samples):
+        action = "jump" if i % 2 == 0 else "attack"
+        for emit in (backend.press, backend.release):
+            start = time.perf_counter_ns()
+            emit(action)
+            latencies.append((time.perf_counter_ns() - start) / 1000.0)
+        # Give the OS input queue a moment, like real gestures would
+        time.sleep(0.001)
+    return latencies
+
+
+def run_latency_comparison(backend_names, samples=500):
+    """Measure each named backend and print a comparison table."""
+    key_mappings = {"left": "Key.left", "right": "Key.right", "jump": "z", "attack": "x"}
+    factories = {
+        "pynput": lambda: PynputBackend(key_mappings),
+        "uinput": lambda: UinputBackend(key_mappings, "keyboard"),
+        "uinput-gamepad": lambda: UinputBackend(key_mappings, "gamepad"),
+        "null": NullBackend,
+        "recording": RecordingBackend,
+    }
+
+    print("--- Output Backend Latency ---")
+    print(f"{samples} press/release pairs per backend (z/x keys or A/X buttons)")
+    print("NOTE: pynput and uinput send real input events to the focused window.")
+    print(f"{'backend':<16} | {'p50 us':>8} | {'p99 us':>8} | {'max us':>8}")
+
+    for name in backend_names:
+        if name not in factories:
+            print(f"{name:<16} | unknown backend")
+            continue
+        try:
+            backend = factories[name]()
+        except Exception as e:
+            print(f"{name:<16} | unavailable: {e}")
+            continue
+        try:
+            latencies = measure_latency(backend, samples)
+        finally:
+            backend.close()
+        p99 = statistics.quantiles(latencies, n=100)[98]
+        print(
+            f"{name:<16} | {statistics.median(latencies):8.1f} | "
+            f"{p99:8.1f} | {max(latencies):8.1f}"
+        )
+
+
+def main():
+    """
+    Command-line interface for the output backends.
+    """
+    if len(sys.argv) > 1 and sys.argv[1] == "--latency":
+        names = sys.argv[2:] or ["null", "recording", "pynput", "uinput", "uinput-gamepad"]
+        run_latency_comparison(names)
+    else:
+        print("Usage:")
+        print("  python output_backends.py --latency [backend ...]   # Compare emit latency")
+        print("  Backends: pynput, uinput, uinput-gamepad, null, recording")
+
+
+if __name__ == "__main__":
+    main()
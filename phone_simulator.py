@@ -0,0 +1,429 @@
+"""
+Synthetic phone simulator and loopback load generator.
+
+Sends the same UDP payloads as the Android app (MainActivity.kt) so that
+udp_listener.py and calibrate.py can be exercised without a phone. Motions are
+scripted (walking, turns, hops, punches) with sensor noise, and the network can
+be made unreliable with packet loss, reordering and burst jitter. Many virtual
+phones can stream at once to find throughput limits.
+
+Examples:
+    python phone_simulator.py
+    python phone_simulator.py --script "walk:5:2.5,hop,punch" --loss 0.05
+    python phone_simulator.py --devices 20 --rate 200 --duration-scale 3
+    python phone_simulator.py --flood --devices 8     # as fast as possible
+    python phone_simulator.py --discover              # find the listener itself
+"""
+
+import argparse
+import heapq
+import json
+import math
+import random
+import socket
+import sys
+import time
+
+from discovery import DiscoveryClient
+
+DEFAULT_SCRIPT = (
+    "idle:1,walk:3:1.8,hop,idle:0.5,punch,idle:0.5,"
+    "turn:180,walk:3:2.5,punch,idle:1"
+)
+
+HOP_PULSE_SEC = 0.12
+PUNCH_PULSE_SEC = 0.10
+GESTURE_SEGMENT_SEC = 0.4
+
+
+# --- Motion Script ---
+def parse_script(script, repeat=1):
+    """
+    Parse a motion script such as "idle:1,walk:3:1.8,turn:180,hop,punch".
+
+    Args:
+        script (str): Comma-separated motions, each "kind[:arg[:arg]]"
+            idle:SECONDS
+            walk:SECONDS[:STEPS_PER_SEC]
+            turn[:DEGREES[:SECONDS]]
+            hop[:PEAK_ACCEL[:DIP]]    (DIP: fraction the rise falls back
+                                      by partway up, a noisy rising edge)
+            punch[:PEAK_ACCEL]
+        repeat (int): How many times to play the script back to back
+
+    Returns:
+        list: (kind, start_sec, duration_sec, params) segments
+    """
+    segments = []
+    t = 0.0
+    for _ in range(repeat):
+        for item in script.split(","):
+            parts = item.strip().split(":")
+            kind, args = parts[0], [float(a) for a in parts[1:]]
+
+            if kind == "idle":
+                duration, params = args[0] if args else 1.0, {}
+            elif kind == "walk":
+                duration = args[0] if args else 3.0
+                params = {"steps_per_sec": args[1] if len(args) > 1 else 1.8}
+            elif kind == "turn":
+                params = {"degrees": args[0] if args else 180.0}
+                duration = args[1] if len(args) > 1 else 0.5
+            elif kind == "hop":
+                duration = GESTURE_SEGMENT_SEC
+                params = {"peak": args[0] if args else 45.0, "dip": args[1] if len(args) > 1 else 0.0}
+            elif kind == "punch":
+                duration, params = GESTURE_SEGMENT_SEC, {"peak": args[0] if args else 50.0}
+            else:
+                raise ValueError(f"Unknown motion '{kind}' in script")
+
+            segments.append((kind, t, duration, params))
+            t += duration
+    return segments
+
+
+def _smoothstep(x):
+    return x * x * (3 - 2 * x)
+
+
+class MotionModel:
+    """World-frame motion of one player, evaluated at any time in the script."""
+
+    def __init__(self, segments, start_yaw_deg=0.0):
+        self.segments = segments
+        self.duration = segments[-1][1] + segments[-1][2] if segments else 0.0
+        # Heading at the start of each segment, accumulated through the turns
+        self.start_yaws = []
+        yaw = start_yaw_deg
+        for kind, _, _, params in segments:
+            self.start_yaws.append(yaw)
+            if kind == "turn":
+                yaw += params["degrees"]
+        self._index = 0
+
+    def _segment_at(self, t):
+        # Queries arrive in time order, so walk forward from the last segment
+        while (
+            self._index < len(self.segments) - 1
+            and t >= self.segments[self._index][1] + self.segments[self._index][2]
+        ):
+            self._index += 1
+        return self._index
+
+    def state(self, t):
+        """
+        Returns:
+            tuple: (yaw_deg, world_ax, world_ay, world_az, yaw_rate_rad_per_sec)
+        """
+        i = self._segment_at(t)
+        kind, start, duration, params = self.segments[i]
+        yaw = self.start_yaws[i]
+        local = t - start
+        ax = ay = az = 0.0
+        yaw_rate = 0.0
+
+        if kind == "walk":
+            # Vertical bob, one cycle per step
+            az = 3.0 * math.sin(2 * math.pi * params["steps_per_sec"] * local)
+        elif kind == "turn":
+            x = min(1.0, max(0.0, local / duration))
+            yaw += params["degrees"] * _smoothstep(x)
+            yaw_rate = math.radians(params["degrees"]) * 6 * x * (1 - x) / duration
+        elif kind == "hop":
+            peak = params["peak"]
+            if local < HOP_PULSE_SEC:
+                az = peak * math.sin(math.pi * local / HOP_PULSE_SEC)
+                if params["dip"] and 0.2 * HOP_PULSE_SEC <= local < 0.45 * HOP_PULSE_SEC:
+                    # The rise stalls and sags before carrying on
+                    az = peak * math.sin(0.2 * math.pi) * (1.0 - params["dip"])
+            elif local < 2 * HOP_PULSE_SEC:
+                az = -0.5 * peak * math.sin(math.pi * (local - HOP_PULSE_SEC) / HOP_PULSE_SEC)
+        elif kind == "punch":
+            peak = params["peak"]
+            if local < PUNCH_PULSE_SEC:
+                forward = peak * math.sin(math.pi * local / PUNCH_PULSE_SEC)
+            elif local < 2 * PUNCH_PULSE_SEC:
+                forward = -0.4 * peak * math.sin(
+                    math.pi * (local - PUNCH_PULSE_SEC) / PUNCH_PULSE_SEC
+                )
+            else:
+                forward = 0.0
+            ax = forward * math.cos(math.radians(yaw))
+            ay = forward * math.sin(math.radians(yaw))
+
+        return yaw, ax, ay, az, yaw_rate
+
+    def ground_truth(self):
+        """Returns (sim_time, gesture) for every scripted gesture and step."""
+        truth = []
+        for i, (kind, start, duration, params) in enumerate(self.segments):
+            if kind == "walk":
+                interval = 1.0 / params["steps_per_sec"]
+                step_t = start + interval
+                while step_t < start + duration:
+                    truth.append((step_t, "step"))
+                    step_t += interval
+            elif kind == "turn":
+                truth.append((start + duration, "turn"))
+            elif kind == "hop":
+                truth.append((start + HOP_PULSE_SEC / 2, "jump"))
+            elif kind == "punch":
+                truth.append((start + PUNCH_PULSE_SEC / 2, "attack"))
+        truth.sort()
+        return truth
+
+
+# --- Virtual Phone ---
+class VirtualPhone:
+    """Produces the sensor packets one phone would send, in timestamp order."""
+
+    def __init__(self, device_id, motion, rate_hz=50.0, noise=0.3, seed=None):
+        self.device_id = device_id
+        self.motion = motion
+        self.rate_hz = rate_hz
+        self.noise = noise
+        self.rng = random.Random(seed)
+        # Android timestamps count from device boot
+        self.boot_offset_ns = self.rng.randrange(10**12, 10**13)
+
+    def packets(self):
+        """Yields (sim_time, payload_bytes) for the whole script."""
+        period = 1.0 / self.rate_hz
+        steps = [t for t, gesture in self.motion.ground_truth() if gesture == "step"]
+        step_index = 0
+        tick = 0
+        gauss = self.rng.gauss
+        noise = self.noise
+
+        while True:
+            t = tick * period
+            if t > self.motion.duration:
+                break
+
+            # Step detector events fall between the regular sensor ticks
+            while step_index < len(steps) and steps[step_index] <= t:
+                step_t = steps[step_index]
+                yield step_t, self._payload("step_detector", step_t)
+                step_index += 1
+
+            yaw, ax, ay, az, yaw_rate = self.motion.state(t)
+            half = math.radians(yaw) / 2
+            qz, qw = math.sin(half), math.cos(half)
+
+            # The phone reports acceleration in its own frame; undo the yaw
+            cos_yaw, sin_yaw = math.cos(2 * half), math.sin(2 * half)
+            dx = cos_yaw * ax + sin_yaw * ay + gauss(0, noise)
+            dy = -sin_yaw * ax + cos_yaw * ay + gauss(0, noise)
+            dz = az + gauss(0, noise)
+
+            yield t, self._payload("rotation_vector", t, (0.0, 0.0, qz, qw))
+            yield t, self._payload("linear_acceleration", t, (dx, dy, dz))
+            yield t, self._payload(
+                "gyroscope", t,
+                (gauss(0, noise * 0.05), gauss(0, noise * 0.05), yaw_rate + gauss(0, noise * 0.05)),
+            )
+            tick += 1
+
+    def _payload(self, sensor, t, values=None):
+        """Formats a packet exactly like MainActivity.onSensorChanged."""
+        timestamp_ns = self.boot_offset_ns + int(t * 1e9)
+        if sensor == "step_detector":
+            text = f'{{"sensor": "step_detector", "timestamp_ns": {timestamp_ns}}}'
+        elif sensor == "rotation_vector":
+            x, y, z, w = values
+            text = (
+                f'{{"sensor": "rotation_vector", "timestamp_ns": {timestamp_ns}, '
+                f'"values": {{"x": {x}, "y": {y}, "z": {z}, "w": {w}}}}}'
+            )
+        else:
+            x, y, z = values
+            text = (
+                f'{{"sensor": "{sensor}", "timestamp_ns": {timestamp_ns}, '
+                f'"values": {{"x": {x}, "y": {y}, "z": {z}}}}}'
+            )
+        return text.encode()
+
+
+# --- Network Impairments ---
+class NetworkImpairment:
+    """Applies loss, reordering and burst jitter to one phone's packet stream."""
+
+    def __init__(self, loss=0.0, reorder=0.0, burst_prob=0.0, burst_ms=0.0, seed=None):
+        self.loss = loss
+        self.reorder = reorder
+        self.burst_prob = burst_prob
+        self.burst_sec = burst_ms / 1000.0
+        self.rng = random.Random(seed)
+        self.dropped = 0
+        self.reordered = 0
+        self.bursts = 0
+
+    def apply(self, packets):
+        """Yields (send_time, payload) with send times never going backwards."""
+        held = None          # a packet waiting to be sent after the next one
+        burst_until = None   # packets are queued until this time, then flushed
+        burst_queue = []
+        rng = self.rng
+
+        for t, payload in packets:
+            if burst_until is not None and t >= burst_until:
+                for queued in burst_queue:
+                    yield burst_until, queued
+                burst_queue = []
+                burst_until = None
+
+            if rng.random() < self.loss:
+                self.dropped += 1
+                continue
+
+            if burst_until is None and rng.random() < self.burst_prob:
+                self.bursts += 1
+                burst_until = t + self.burst_sec
+
+            if held is None and rng.random() < self.reorder:
+                self.reordered += 1
+                held = payload
+                continue
+
+            ready = [payload] if held is None else [payload, held]
+            held = None
+            if burst_until is not None:
+                burst_queue.extend(ready)
+            else:
+                for item in ready:
+                    yield t, item
+
+        if held is not None:
+            burst_queue.append(held)
+        for queued in burst_queue:
+            yield burst_until if burst_until is not None else t, queued
+
+
+# --- Sender ---
+def run_simulation(args):
+    """Stream every virtual phone to the target and print a summary."""
+    segments = parse_script(args.script, args.repeat)
+    if args.duration_scale != 1.0:
+        segments = [
+            (kind, start * args.duration_scale, duration * args.duration_scale, params)
+            for kind, start, duration, params in segments
+        ]
+
+    phones = []
+    impairments = []
+    streams = []
+    for device_id in range(args.devices):
+        seed = None if args.seed is None else args.seed + device_id
+        motion = MotionModel(segments)
+        phone = VirtualPhone(device_id, motion, args.rate, args.noise, seed)
+        impairment = NetworkImpairment(
+            args.loss, args.reorder, args.burst_prob, args.burst_ms, seed
+        )
+        phones.append(phone)
+        impairments.append(impairment)
+        streams.append(
+            ((send_t, device_id, payload) for send_t, payload in impairment.apply(phone.packets()))
+        )
+
+    # Each phone gets its own socket (and source port), like separate devices
+    sockets = [socket.socket(socket.AF_INET, socket.SOCK_DGRAM) for _ in phones]
+    target = (args.host, args.port)
+
+    print("--- Silksong Phone Simulator ---")
+    print(f"Target: {args.host}:{args.port} | Devices: {args.devices} | "
+          f"Rate: {args.rate:.0f} Hz/sensor | Script: {segments[-1][1] + segments[-1][2]:.1f}s")
+    if args.flood:
+        print("Flood mode: sending as fast as possible")
+    print("---------------------------------------")
+
+    sent = 0
+    send_errors = 0
+    max_lateness = 0.0
+    start_wall = time.time()
+    start = time.perf_counter()
+    try:
+        for send_t, device_id, payload in heapq.merge(*streams, key=lambda item: item[0]):
+            if not args.flood:
+                delay = start + send_t - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    max_lateness = max(max_lateness, -delay)
+            try:
+                sockets[device_id].sendto(payload, target)
+                sent += 1
+            except OSError:
+                send_errors += 1
+    except KeyboardInterrupt:
+        print("\nSimulation interrupted.")
+    finally:
+        for sock in sockets:
+            sock.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"Sent {sent} packets in {elapsed:.2f}s ({sent / max(elapsed, 1e-9):.0f} packets/s)")
+    print(f"Dropped (simulated loss): {sum(i.dropped for i in impairments)} | "
+          f"Reordered: {sum(i.reordered for i in impairments)} | "
+          f"Bursts: {sum(i.bursts for i in impairments)} | Send errors: {send_errors}")
+    if not args.flood:
+        print(f"Worst lateness vs. schedule: {max_lateness * 1000:.1f}ms")
+
+    if args.truth_file:
+        with open(args.truth_file, "w", encoding="utf-8") as f:
+            for phone in phones:
+                for sim_t, gesture in phone.motion.ground_truth():
+                    f.write(json.dumps({
+                        "device": phone.device_id,
+                        "time": start_wall + sim_t,
+                        "gesture": gesture,
+                    }) + "\n")
+        print(f"Ground truth written to {args.truth_file}")
+
+
+def main():
+    """
+    Command-line interface for the phone simulator.
+    """
+    try:
+        with open("config.json", "r", encoding="utf-8") as f:
+            network = json.load(f)["network"]
+        default_host, default_port = network["listen_ip"], network["listen_port"]
+    except (FileNotFoundError, json.JSONDecodeError, KeyError):
+        default_host, default_port = "127.0.0.1", 12345
+    if default_host == "0.0.0.0":
+        default_host = "127.0.0.1"
+
+    parser = argparse.ArgumentParser(description="Simulate Silksong controller phones over UDP.")
+    parser.add_argument("--host", default=default_host, help="Listener IP (default: from config.json)")
+    parser.add_argument("--port", type=int, default=default_port, help="Listener port (default: from config.json)")
+    parser.add_argument("--script", default=DEFAULT_SCRIPT, help="Motion script, e.g. 'walk:3:2,hop,punch'")
+    parser.add_argument("--repeat", type=int, default=1, help="Play the script this many times")
+    parser.add_argument("--duration-scale", type=float, default=1.0, help="Stretch every motion in time")
+    parser.add_argument("--devices", type=int, default=1, help="Number of concurrent virtual phones")
+    parser.add_argument("--rate", type=float, default=50.0, help="Samples per second per sensor (app uses ~50)")
+    parser.add_argument("--noise", type=float, default=0.3, help="Sensor noise std-dev in m/s²")
+    parser.add_argument("--loss", type=float, default=0.0, help="Packet loss probability")
+    parser.add_argument("--reorder", type=float, default=0.0, help="Probability a packet is swapped with the next")
+    parser.add_argument("--burst-prob", type=float, default=0.0, help="Probability a packet starts a jitter burst")
+    parser.add_argument("--burst-ms", type=float, default=100.0, help="How long a jitter burst holds packets")
+    parser.add_argument("--flood", action="store_true", help="Ignore timing and send as fast as possible")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for repeatable runs")
+    parser.add_argument("--truth-file", default=None, help="Write scripted gestures as JSONL for accuracy checks")
+    parser.add_argument("--discover", action="store_true",
+                        help="Find the listener with the discovery protocol instead of --host/--port")
+    args = parser.parse_args()
+
+    if args.discover:
+        client = DiscoveryClient("phone-simulator", hosts=["127.0.0.1"])
+        welcome = client.hello(timeout=1.0)
+        client.close()
+        if welcome is None:
+            print("ERROR: No listener answered. Is discovery enabled in config.json?")
+            sys.exit(1)
+        args.host, args.port = welcome["address"], welcome["port"]
+        print(f"Discovered listener at {args.host}:{args.port} (session {welcome['session']})")
+    run_simulation(args)
+
+
+if __name__ == "__main__":
+    main()
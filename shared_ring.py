@@ -0,0 +1,256 @@
+"""
+Shared-memory ring buffer for decoded sensor samples.
+
+The listener is the single producer: every packet it decodes is written into a
+fixed-size ring in multiprocessing.shared_memory as a packed record. Any number
+of consumer processes (dashboards, recorders, analysis) can attach by name and
+read with their own cursor, without re-parsing UDP JSON and without ever
+blocking the listener.
+
+Record layout (little-endian, 48 bytes):
+    int64   seq            - sequence number of this record (-1 while writing)
+    int64   timestamp_ns   - sensor timestamp from the phone
+    int64   received_ns    - host monotonic time the packet was decoded
+    int32   sensor_id      - see SENSOR_IDS
+    int32   reserved
+    float32 x, y, z, w     - sensor values (unused fields are 0.0)
+"""
+
+import struct
+import sys
+import time
+from collections import namedtuple
+from multiprocessing import resource_tracker, shared_memory
+
+HEADER_FORMAT = "<4sIIq"  # magic, capacity, record size, next sequence number
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+RECORD_FORMAT = "<qqqii4f"
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+MAGIC = b"SSRB"
+
+# Offset of the "next sequence number" field inside the header
+_WRITE_SEQ_OFFSET = struct.calcsize("<4sII")
+
+SENSOR_IDS = {
+    "rotation_vector": 1,
+    "linear_acceleration": 2,
+    "gyroscope": 3,
+    "step_detector": 4,
+}
+SENSOR_NAMES = {sensor_id: name for name, sensor_id in SENSOR_IDS.items()}
+
+SensorSample = namedtuple(
+    "SensorSample", "seq sensor timestamp_ns received_ns x y z w"
+)
+
+
+class SensorRing:
+    """A single-producer/multi-consumer ring of sensor records in shared memory."""
+
+    def __init__(self, shm, capacity, owner):
+        self.shm = shm
+        self.buf = shm.buf
+        self.capacity = capacity
+        self.owner = owner
+        self._next_seq = self._read_write_seq()
+
+    @classmethod
+    def create(cls, name, capacity=4096):
+        """
+        Create a new ring, replacing any stale segment left by a crashed listener.
+
+        Args:
+            name (str): Shared memory segment name consumers will attach to
+            capacity (int): Number of records the ring holds before wrapping
+
+        Returns:
+            SensorRing: The producer-side ring
+        """
+        size = HEADER_SIZE + capacity * RECORD_SIZE
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+
+        struct.pack_into(HEADER_FORMAT, shm.buf, 0, MAGIC, capacity, RECORD_SIZE, 0)
+        return cls(shm, capacity, owner=True)
+
+    @classmethod
+    def attach(cls, name):
+        """
+        Attach to an existing ring created by the listener.
+
+        Args:
+            name (str): Shared memory segment name
+
+        Returns:
+            SensorRing: A consumer-side ring (never unlinks the segment)
+        """
+        shm = shared_memory.SharedMemory(name=name)
+        # Before Python 3.13 the resource tracker unlinks every segment a
+        # process touched when it exits, which would pull the ring out from
+        # under the listener as soon as one consumer quits.
+        try:
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:
+            pass
+
+        magic, capacity, record_size, _ = struct.unpack_from(HEADER_FORMAT, shm.buf, 0)
+        if magic != MAGIC or record_size != RECORD_SIZE:
+            shm.close()
+            raise ValueError(f"Shared memory '{name}' is not a sensor ring")
+        return cls(shm, capacity, owner=False)
+
+    def _read_write_seq(self):
+        return struct.unpack_from("<q", self.buf, _WRITE_SEQ_OFFSET)[0]
+
+    def write(self, sensor, timestamp_ns, values=None):
+        """
+        Append one decoded sample. Never blocks; old records are overwritten.
+
+        Returns:
+            bool: False if the sample had the wrong field types and was skipped
+        """
+        if type(timestamp_ns) is not int or not -(2**63) <= timestamp_ns < 2**63:
+            return False
+        sensor_id = SENSOR_IDS.get(sensor, 0) if isinstance(sensor, str) else 0
+        if values:
+            if not isinstance(values, dict):
+                return False
+            x = values.get("x", 0.0)
+            y = values.get("y", 0.0)
+            z = values.get("z", 0.0)
+            w = values.get("w", 0.0)
+            if not all(type(v) in (int, float) for v in (x, y, z, w)):
+                return False
+        else:
+            x = y = z = w = 0.0
+
+        seq = self._next_seq
+        offset = HEADER_SIZE + (seq % self.capacity) * RECORD_SIZE
+
+        # Mark the slot as in-progress, fill it, then publish the sequence
+        # number. Readers check the slot seq before and after copying, so a
+        # record the writer is overwriting is never returned half-written.
+        try:
+            struct.pack_into(
+                RECORD_FORMAT, self.buf, offset,
+                -1, timestamp_ns, time.monotonic_ns(), sensor_id, 0, x, y, z, w,
+            )
+        except (struct.error, OverflowError):
+            # Values too large for float32; nothing was written
+            return False
+        struct.pack_into("<q", self.buf, offset, seq)
+
+        self._next_seq = seq + 1
+        struct.pack_into("<q", self.buf, _WRITE_SEQ_OFFSET, self._next_seq)
+        return True
+
+    def reader(self, from_start=False):
+        """Returns a new independent cursor over this ring."""
+        return RingReader(self, from_start)
+
+    def close(self):
+        """Detach from the segment; the producer also removes it."""
+        self.buf = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class RingReader:
+    """A consumer cursor. Each consumer keeps its own and never affects others."""
+
+    def __init__(self, ring, from_start=False):
+        self.ring = ring
+        write_seq = ring._read_write_seq()
+        if from_start:
+            self.cursor = max(0, write_seq - ring.capacity)
+        else:
+            self.cursor = write_seq
+        # Records overwritten before this reader got to them
+        self.lost = 0
+
+    def read(self, max_items=None):
+        """
+        Read every record published since the last call.
+
+        Args:
+            max_items (int): Optional cap on how many records to return
+
+        Returns:
+            list: SensorSample tuples in sequence order
+        """
+        ring = self.ring
+        buf = ring.buf
+        capacity = ring.capacity
+        write_seq = ring._read_write_seq()
+
+        if write_seq - self.cursor > capacity:
+            self.lost += write_seq - capacity - self.cursor
+            self.cursor = write_seq - capacity
+
+        end = write_seq
+        if max_items is not None:
+            end = min(end, self.cursor + max_items)
+
+        samples = []
+        while self.cursor < end:
+            offset = HEADER_SIZE + (self.cursor % capacity) * RECORD_SIZE
+            record = struct.unpack_from(RECORD_FORMAT, buf, offset)
+            seq_after = struct.unpack_from("<q", buf, offset)[0]
+
+            if record[0] != self.cursor or seq_after != self.cursor:
+                # The writer lapped us mid-read; jump to the oldest live record
+                write_seq = ring._read_write_seq()
+                oldest = max(self.cursor + 1, write_seq - capacity)
+                self.lost += oldest - self.cursor
+                self.cursor = oldest
+                continue
+
+            seq, timestamp_ns, received_ns, sensor_id, _, x, y, z, w = record
+            samples.append(
+                SensorSample(
+                    seq, SENSOR_NAMES.get(sensor_id, "unknown"),
+                    timestamp_ns, received_ns, x, y, z, w,
+                )
+            )
+            self.cursor += 1
+
+        return samples
+
+
+def main():
+    """
+    Command-line consumer that tails a live ring, mainly for checking the feed.
+    """
+    name = sys.argv[1] if len(sys.argv) > 1 else "silksong_sensors"
+    try:
+        ring = SensorRing.attach(name)
+    except FileNotFoundError:
+        print(f"Error: No sensor ring named '{name}'.")
+        print("Enable 'shared_ring' in config.json and start udp_listener.py first.")
+        return
+
+    reader = ring.reader()
+    print(f"Attached to '{name}' ({ring.capacity} records). Press Ctrl+C to stop.")
+    try:
+        while True:
+            for sample in reader.read():
+                print(
+                    f"{sample.seq:>8} {sample.sensor:<20} "
+                    f"x={sample.x:7.2f} y={sample.y:7.2f} "
+                    f"z={sample.z:7.2f} w={sample.w:7.2f}"
+                )
+            time.sleep(0.01)
+    except KeyboardInterrupt:
+        print(f"\nStopped. Records lost to overrun: {reader.lost}")
+    finally:
+        ring.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,29 +2,40 @@ import socket
 import json
 import time
 import math
+import os
 import threading
 from collections import deque
-from pynput.keyboard import Controller, Key
 import network_utils
+from shared_ring import SensorRing
+from analysis_pipeline import AnalysisPipeline, build_stages
+from adaptive_thresholds import ThresholdAdapter
+from output_backends import ACTIONS, create_backend
+from walk_cadence import WalkSpeedModel, drive_walk
+from instrumentation import (
+    ControlServer,
+    ListenerStats,
+    MetricsServer,
+    ProfileController,
+    install_signal_handler,
+)
+from gesture_log import GestureLog
+from orientation import OrientationStore
+from discovery import DiscoveryServer
+from jump_predictor import JumpPredictor
+from action_scheduler import ActionScheduler, ComboEngine
 
-# --- Global State ---
-keyboard = Controller()
-is_walking = False
-last_step_time = 0
-walking_thread = None
-stop_walking_event = threading.Event()
-# The core state for our character's direction
-facing_direction = "right"
-# A variable to store the phone's current orientation
-last_known_orientation = {"x": 0, "y": 0, "z": 0, "w": 1}
-
-# --- NEW: Walk Fuel System ---
-walk_fuel_seconds = 0.0
-last_frame_time = time.time()
+# --- Detection constants ---
+# Per-packet state (facing direction, walk fuel, peaks, ...) lives in
+# PacketProcessor below
 
 # --- NEW: Attack debouncing to prevent rapid-fire attacks ---
-last_attack_time = 0
 ATTACK_COOLDOWN_SEC = 0.3  # Minimum time between attacks
+# NEW: World Z must fall below jump threshold * this before the next jump
+JUMP_REARM_FRACTION = 0.3
+# NEW: Hardcoded stability threshold for pitch/roll stability check
+STABILITY_THRESHOLD_DEGREES = 40.0
+# NEW: Z-axis stability factor for attack detection (prevents attack during jumps)
+ATTACK_Z_STABILITY_FACTOR = 0.7  # Z-axis must be < punch_threshold * this factor
 
 
 # --- NEW: The core mathematical helper function ---
@@ -71,61 +82,6 @@ def load_config():
         exit(1)
 
 
-def get_key(key_string):
-    """Converts a string from config to a pynput Key object if needed."""
-    if key_string.startswith("Key."):
-        key_name = key_string.split(".")[-1]
-        if hasattr(Key, key_name):
-            return getattr(Key, key_name)
-    return key_string
-
-
-# Load configuration at startup
-config = load_config()
-
-# Auto-detect and update IP address
-print("🔍 Auto-detecting IP address...")
-network_utils.update_config_ip()
-# Reload config to get the updated IP
-config = load_config()
-
-# Extract configuration values
-LISTEN_IP = config["network"]["listen_ip"]
-LISTEN_PORT = config["network"]["listen_port"]
-FUEL_ADDED_PER_STEP = config["thresholds"]["fuel_added_per_step_sec"]
-MAX_FUEL_CAPACITY = config["thresholds"]["max_fuel_sec"]
-PUNCH_THRESHOLD = config["thresholds"]["punch_threshold_xy_accel"]
-JUMP_THRESHOLD = config["thresholds"]["jump_threshold_z_accel"]
-TURN_THRESHOLD = config["thresholds"]["turn_threshold_degrees"]
-# NEW: Hardcoded stability threshold for pitch/roll stability check
-STABILITY_THRESHOLD_DEGREES = 40.0
-# NEW: Z-axis stability factor for attack detection (prevents attack during jumps)
-ATTACK_Z_STABILITY_FACTOR = 0.7  # Z-axis must be < punch_threshold * this factor
-
-# Load key mappings from config
-KEY_MAP = {
-    "left": get_key(config["keyboard_mappings"]["left"]),
-    "right": get_key(config["keyboard_mappings"]["right"]),
-    "jump": get_key(config["keyboard_mappings"]["jump"]),
-    "attack": get_key(config["keyboard_mappings"]["attack"]),
-}
-
-
-# --- Walker Thread ---
-def walker_thread_func():
-    global is_walking
-    is_walking = True
-
-    # Press left or right arrow based on facing direction
-    key_to_press = KEY_MAP["right"] if facing_direction == "right" else KEY_MAP["left"]
-    keyboard.press(key_to_press)
-
-    stop_walking_event.wait()
-
-    keyboard.release(key_to_press)
-    is_walking = False
-
-
 # --- Helper Functions ---
 def quaternion_to_roll(qx, qy, qz, qw):
     """Convert quaternion to roll angle in degrees."""
@@ -137,8 +93,8 @@ def quaternion_to_roll(qx, qy, qz, qw):
 
 
 def quaternion_to_euler(q):
-    """Converts a quaternion dict into yaw, pitch, roll in degrees."""
-    x, y, z, w = q["x"], q["y"], q["z"], q["w"]
+    """Converts a unit (x, y, z, w) quaternion into yaw, pitch, roll in degrees."""
+    x, y, z, w = q
 
     # Roll (x-axis rotation)
     sinr_cosp = 2 * (w * x + y * z)
@@ -160,165 +116,347 @@ def quaternion_to_euler(q):
     return yaw, pitch, roll
 
 
-# --- Main Listener Logic ---
-sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-sock.bind((LISTEN_IP, LISTEN_PORT))
+def is_stable_turn(orientation_history, turn_threshold):
+    """Checks a full orientation window for a large yaw change with steady pitch/roll."""
+    # Check for a turn only if our history buffer is full
+    if len(orientation_history) < orientation_history.maxlen:
+        return False
+
+    oldest_orientation = orientation_history[0]
+    current_orientation = orientation_history[-1]
+
+    # Calculate change in all three angles
+    yaw_diff = 180 - abs(
+        abs(current_orientation["yaw"] - oldest_orientation["yaw"]) - 180
+    )
+    pitch_diff = abs(current_orientation["pitch"] - oldest_orientation["pitch"])
+    roll_diff = abs(current_orientation["roll"] - oldest_orientation["roll"])
+
+    # NEW: The Stability Check
+    is_stable = (pitch_diff < STABILITY_THRESHOLD_DEGREES) and (
+        roll_diff < STABILITY_THRESHOLD_DEGREES
+    )
+    return yaw_diff > turn_threshold and is_stable
+
+
+def detect_action(world_z, world_xy_magnitude, jump_threshold, punch_threshold,
+                  seconds_since_attack):
+    """Returns "jump", "attack" or None for one world-frame acceleration sample."""
+    if world_z > jump_threshold:
+        return "jump"
+
+    # Attack detection with improved conditions to prevent conflicts with jumps
+    if (
+        world_xy_magnitude > punch_threshold
+        and abs(world_z) < punch_threshold * ATTACK_Z_STABILITY_FACTOR
+        and seconds_since_attack > ATTACK_COOLDOWN_SEC
+    ):
+        return "attack"
+    return None
+
+
+def format_dashboard(facing_direction, walk_status, walk_fuel_seconds, max_fuel,
+                     peak_z_accel, peak_xy_accel, peak_yaw_rate):
+    """Builds the one-line status dashboard shown while the controller runs."""
+    # Create walk fuel bar visualization
+    fuel_percentage = walk_fuel_seconds / max_fuel
+    fuel_bar_length = 8
+    filled_bars = int(fuel_percentage * fuel_bar_length)
+    empty_bars = fuel_bar_length - filled_bars
+    fuel_bar = "[" + "#" * filled_bars + "-" * empty_bars + "]"
+
+    # Updated dashboard to show world coordinates and walk fuel
+    return (
+        f"\rFacing: {facing_direction.upper().ljust(7)} | "
+        f"Walk: {walk_status.ljust(7)} | "
+        f"Fuel: {fuel_bar} {walk_fuel_seconds:.1f}s | "
+        f"World Z-A:{peak_z_accel:4.1f} | "
+        f"World XY-A:{peak_xy_accel:4.1f} | "
+        f"Yaw:{peak_yaw_rate:3.1f}"
+    )
+
+
+
+
+class PacketProcessor:
+    """
+    Everything the listener does with one packet: decode, detect, actuate.
+
+    main() feeds it datagrams from the socket; benchmarks/pipeline.py feeds it
+    simulated or recorded packets, so both run exactly the same code.
+
+    Args:
+        config (dict): The full configuration
+        output_backend (OutputBackend): Where key presses go
+        listener_stats (ListenerStats): Runtime counters
+        sensor_ring (SensorRing): Shared-memory feed, or None
+        analysis_pipeline (AnalysisPipeline): Background analysis, or None
+        gesture_log (GestureLog): Gesture log, or None
+        quiet (bool): Don't print gesture messages or the dashboard
+
+    Raises:
+        ValueError: If the "actions" section is invalid
+    """
+
+    def __init__(self, config, output_backend, listener_stats, sensor_ring=None,
+                 analysis_pipeline=None, gesture_log=None, quiet=False):
+        self.output_backend = output_backend
+        self.listener_stats = listener_stats
+        self.sensor_ring = sensor_ring
+        self.analysis_pipeline = analysis_pipeline
+        self.gesture_log = gesture_log
+        self.quiet = quiet
+
+        thresholds = config["thresholds"]
+        self.fuel_added_per_step = thresholds["fuel_added_per_step_sec"]
+        self.max_fuel = thresholds["max_fuel_sec"]
+        self.turn_threshold = thresholds["turn_threshold_degrees"]
+        self.jump_threshold = thresholds["jump_threshold_z_accel"]
+        self.punch_threshold = thresholds["punch_threshold_xy_accel"]
+
+        # --- NEW: Analog walking speed from step cadence (see walk_cadence.py) ---
+        # None keeps the classic full-speed walk
+        walk_speed_config = config.get("walk_speed", {})
+        self.walk_speed = None
+        if walk_speed_config.get("enabled", False):
+            self.walk_speed = WalkSpeedModel(walk_speed_config)
+
+        # --- NEW: Online threshold adaptation ---
+        # Thresholds follow the player as they tire; see adaptive_thresholds.py.
+        # The calibrated values are only the starting point.
+        adaptive_config = config.get("adaptive_thresholds", {})
+        self.threshold_adapter = None
+        if adaptive_config.get("enabled", False):
+            self.threshold_adapter = ThresholdAdapter(
+                {"jump": self.jump_threshold, "attack": self.punch_threshold}, adaptive_config
+            )
+            # Picks up where the last session left off
+            self.jump_threshold = self.threshold_adapter.threshold("jump")
+            self.punch_threshold = self.threshold_adapter.threshold("attack")
+
+        # --- NEW: Predictive early jump (see jump_predictor.py) ---
+        prediction_config = config.get("jump_prediction", {})
+        self.jump_predictor = None
+        if prediction_config.get("enabled", False):
+            self.jump_predictor = JumpPredictor(prediction_config)
+        # One jump per hop: holds no longer block, so samples after the first
+        # crossing would otherwise jump again
+        self.jump_armed = True
+
+        # --- NEW: Scheduled key holds and combos (see action_scheduler.py) ---
+        # Keys are pressed immediately and released by one timer thread, so the
+        # packet loop never sleeps through a hold
+        actions_config = config.get("actions", {})
+        self.combo_specs = []
+        for combo in actions_config.get("combos", []):
+            missing = [
+                key for key in combo.get("keys", [])
+                if key not in ACTIONS and key not in config["keyboard_mappings"]
+            ]
+            if missing:
+                print(
+                    f"Warning: Combo '{combo.get('name')}' needs keyboard_mappings for "
+                    f"{', '.join(missing)}; combo disabled."
+                )
+                continue
+            self.combo_specs.append(combo)
+        self.action_scheduler = ActionScheduler(
+            output_backend, actions_config.get("hold", {}), actions_config.get("frame_rate", 60.0)
+        )
+        self.combo_engine = ComboEngine(self.combo_specs) if self.combo_specs else None
+        self.action_scheduler.start()
+
+        # The core state for our character's direction
+        self.facing_direction = "right"
+        # Recent phone orientations by sensor time, for world-frame acceleration
+        self.orientation_store = OrientationStore()
+        # A buffer to store recent orientation history for turn detection
+        # We'll store ~0.5 seconds of data (at 50Hz, that's 25 samples)
+        self.orientation_history = deque(maxlen=25)
+
+        # --- NEW: Walk Fuel System ---
+        self.walk_fuel_seconds = 0.0
+        self.last_frame_time = None
+        self.is_walking = False
+        self.walking_thread = None
+        self.stop_walking_event = threading.Event()
+
+        # --- NEW: Attack debouncing to prevent rapid-fire attacks ---
+        self.last_attack_time = 0
+
+        # --- NEW: Separate peak accel trackers for tuning ---
+        self.peak_z_accel = 0.0
+        self.peak_xy_accel = 0.0
+        self.peak_yaw_rate = 0.0
+
+    def _print(self, *args, **kwargs):
+        if not self.quiet:
+            print(*args, **kwargs)
+
+    # --- Walker Thread ---
+    def _walk(self):
+        self.is_walking = True
+
+        # Press left or right based on facing direction
+        direction = self.facing_direction
+        if self.walk_speed is not None:
+            drive_walk(self.output_backend, direction, self.stop_walking_event, self.walk_speed)
+        else:
+            self.output_backend.press(direction)
+            self.stop_walking_event.wait()
+            self.output_backend.release(direction)
+        self.is_walking = False
+
+    def _fire_combo(self, combo, timestamp, sensor_time):
+        self.action_scheduler.tap(combo["keys"], combo.get("frames", 4))
+        self._print(f"\n--- COMBO: {combo.get('name', 'combo').upper()} ---")
+        self.listener_stats.count_action(combo.get("name", "combo"))
+        if self.gesture_log is not None:
+            self.gesture_log.record(
+                combo.get("name", "combo"), timestamp, sensor_time=sensor_time, keys=combo["keys"]
+            )
 
-print("--- Silksong Controller v1.0 (Final) ---")
-print(f"Listening on {LISTEN_IP}:{LISTEN_PORT}")
-print("Official Hollow Knight/Silksong key mappings:")
-print(
-    f"  Movement: {config['keyboard_mappings']['left']}/{config['keyboard_mappings']['right']} (direction-based)"
-)
-print(
-    f"  Jump: {config['keyboard_mappings']['jump']} | Attack: {config['keyboard_mappings']['attack']}"
-)
-print("---------------------------------------")
-
-current_roll = 0.0
-current_tilt_state = "CENTERED"
-# --- NEW: Separate peak accel trackers for tuning ---
-peak_z_accel = 0.0
-peak_xy_accel = 0.0
-peak_yaw_rate = 0.0  # NEW: for tuning the turn
-# NEW: A buffer to store recent orientation history for turn detection
-# We'll store ~0.5 seconds of data (at 50Hz, that's 25 samples)
-# Modified to store full orientation tuples (yaw, pitch, roll)
-orientation_history = deque(maxlen=25)
-
-try:
-    while True:
-        data, addr = sock.recvfrom(2048)
+    def metrics_state(self):
+        # Read by the metrics thread at scrape time, so the packet loop
+        # doesn't copy anything for it
+        return {
+            "facing_direction": self.facing_direction,
+            "walking": self.is_walking,
+            "walk_fuel_seconds": self.walk_fuel_seconds,
+            "peak_z_accel": self.peak_z_accel,
+            "peak_xy_accel": self.peak_xy_accel,
+            "thresholds": {"jump": self.jump_threshold, "attack": self.punch_threshold},
+        }
+
+    def process(self, data, current_time, packet_start):
+        """
+        Handle one datagram.
+
+        Args:
+            data (bytes): The raw packet
+            current_time (float): Wall-clock arrival time (time.time())
+            packet_start (int): perf_counter_ns() at arrival, for stage timing
+
+        Returns:
+            str: The dashboard line, or None if the packet was malformed
+        """
+        listener_stats = self.listener_stats
+        analysis_pipeline = self.analysis_pipeline
+        gesture_log = self.gesture_log
+        stage_start = packet_start
+
+        if analysis_pipeline is not None:
+            analysis_pipeline.submit(("packet", current_time, data))
 
         # --- NEW: Walk Fuel System Logic ---
-        current_time = time.time()
-        delta_time = current_time - last_frame_time
-        last_frame_time = current_time
+        if self.last_frame_time is None:
+            self.last_frame_time = current_time
+        delta_time = current_time - self.last_frame_time
+        self.last_frame_time = current_time
 
         # Deplete fuel over time
-        walk_fuel_seconds = max(0.0, walk_fuel_seconds - delta_time)
+        self.walk_fuel_seconds = max(0.0, self.walk_fuel_seconds - delta_time)
 
         # Start walking if we have fuel and aren't already walking
-        if walk_fuel_seconds > 0 and not is_walking and walking_thread is None:
-            stop_walking_event.clear()
-            walking_thread = threading.Thread(target=walker_thread_func)
-            walking_thread.start()
+        if self.walk_fuel_seconds > 0 and not self.is_walking and self.walking_thread is None:
+            self.stop_walking_event.clear()
+            self.walking_thread = threading.Thread(target=self._walk)
+            self.walking_thread.start()
 
         # Stop walking if we're out of fuel
-        elif walk_fuel_seconds <= 0 and is_walking:
-            stop_walking_event.set()
-            if walking_thread is not None:
-                walking_thread.join()
-                walking_thread = None
+        elif self.walk_fuel_seconds <= 0 and self.is_walking:
+            self.stop_walking_event.set()
+            if self.walking_thread is not None:
+                self.walking_thread.join()
+                self.walking_thread = None
+        stage_start = listener_stats.lap("walk_fuel", stage_start)
 
         try:
             parsed_json = json.loads(data.decode())
             sensor_type = parsed_json.get("sensor")
+            listener_stats.count_packet(sensor_type)
+
+            # Everything downstream (orientation, cadence, predictor,
+            # adapter, combos) runs on sensor time, so check it once here:
+            # an int64 like Android's SensorEvent.timestamp (json.loads also
+            # accepts NaN, Infinity and strings)
+            timestamp_ns = parsed_json["timestamp_ns"]
+            if type(timestamp_ns) is not int or not -(2**63) <= timestamp_ns < 2**63:
+                listener_stats.count_error()
+                return None
+
+            if self.sensor_ring is not None and not self.sensor_ring.write(
+                sensor_type,
+                timestamp_ns,
+                parsed_json.get("values"),
+            ):
+                # Malformed but valid JSON: skip it like a decode error
+                listener_stats.count_error()
+                return None
+            stage_start = listener_stats.lap("decode", stage_start)
 
             # NEW: Rotation vector now used for turn detection with stability check
             if sensor_type == "rotation_vector":
                 vals = parsed_json["values"]
 
-                # Store the orientation for world coordinate transformation
-                last_known_orientation.update(vals)
+                # Store the orientation for world coordinate transformation;
+                # the store rebuilds w when the phone sends the w = 0 placeholder
+                quaternion = self.orientation_store.add(timestamp_ns, vals)
 
                 # Convert quaternion to all three Euler angles
-                yaw, pitch, roll = quaternion_to_euler(vals)
+                yaw, pitch, roll = quaternion_to_euler(quaternion)
 
                 # Add current orientation to our history
-                orientation_history.append({"yaw": yaw, "pitch": pitch, "roll": roll})
-
-                # Check for a turn only if our history buffer is full
-                if len(orientation_history) == orientation_history.maxlen:
-                    oldest_orientation = orientation_history[0]
-                    current_orientation = orientation_history[-1]
-
-                    # Calculate change in all three angles
-                    yaw_diff = 180 - abs(
-                        abs(current_orientation["yaw"] - oldest_orientation["yaw"])
-                        - 180
-                    )
-                    pitch_diff = abs(
-                        current_orientation["pitch"] - oldest_orientation["pitch"]
-                    )
-                    roll_diff = abs(
-                        current_orientation["roll"] - oldest_orientation["roll"]
-                    )
-
-                    # NEW: The Stability Check
-                    is_stable = (pitch_diff < STABILITY_THRESHOLD_DEGREES) and (
-                        roll_diff < STABILITY_THRESHOLD_DEGREES
-                    )
-
-                    if yaw_diff > TURN_THRESHOLD and is_stable:
-                        print("\n--- STABLE TURN DETECTED! ---")
-                        if facing_direction == "right":
-                            facing_direction = "left"
-                        else:
-                            facing_direction = "right"
-                        print(f"Now facing {facing_direction.upper()}")
-
-                        # --- NEW: Deplete walk fuel for a sharp turn ---
-                        walk_fuel_seconds = 0.2
-                        # Clear to prevent multiple triggers
-                        orientation_history.clear()
+                self.orientation_history.append({"yaw": yaw, "pitch": pitch, "roll": roll})
+
+                if is_stable_turn(self.orientation_history, self.turn_threshold):
+                    self._print("\n--- STABLE TURN DETECTED! ---")
+                    if self.facing_direction == "right":
+                        self.facing_direction = "left"
+                    else:
+                        self.facing_direction = "right"
+                    self._print(f"Now facing {self.facing_direction.upper()}")
+                    listener_stats.count_action("turn")
+                    if gesture_log is not None:
+                        gesture_log.record(
+                            "turn",
+                            current_time,
+                            sensor_time=timestamp_ns / 1e9,
+                            facing=self.facing_direction,
+                            yaw=yaw,
+                            threshold=self.turn_threshold,
+                        )
+                    if analysis_pipeline is not None:
+                        analysis_pipeline.submit(
+                            ("action", current_time, ("turn", {"facing": self.facing_direction}))
+                        )
+
+                    # --- NEW: Deplete walk fuel for a sharp turn ---
+                    self.walk_fuel_seconds = 0.2
+                    # Clear to prevent multiple triggers
+                    self.orientation_history.clear()
+                stage_start = listener_stats.lap(sensor_type, stage_start)
 
             elif sensor_type == "step_detector":
                 # --- NEW: Simple fuel addition system ---
                 # Add fuel to the tank, capping at maximum capacity
-                new_fuel = walk_fuel_seconds + FUEL_ADDED_PER_STEP
-                walk_fuel_seconds = min(MAX_FUEL_CAPACITY, new_fuel)
-                # Note: Walking start/stop logic is now handled in main loop
+                new_fuel = self.walk_fuel_seconds + self.fuel_added_per_step
+                self.walk_fuel_seconds = min(self.max_fuel, new_fuel)
+                if self.walk_speed is not None:
+                    self.walk_speed.add_step(timestamp_ns / 1e9)
+                if self.combo_engine is not None:
+                    step_time = timestamp_ns / 1e9
+                    combo = self.combo_engine.observe("step", step_time)
+                    if combo is not None:
+                        self._fire_combo(combo, current_time, step_time)
+                # Note: Walking start/stop logic is handled at the top of process()
+                stage_start = listener_stats.lap(sensor_type, stage_start)
 
             # --- REFACTORED: Acceleration logic now uses world coordinates ---
             elif sensor_type == "linear_acceleration":
-                vals = parsed_json["values"]
-                accel_vector = [vals["x"], vals["y"], vals["z"]]
-
-                # Perform the transformation to world coordinates
-                world_accel = rotate_vector_by_quaternion(
-                    accel_vector, last_known_orientation
+                stage_start = self._process_acceleration(
+                    parsed_json["values"], timestamp_ns, current_time, packet_start, stage_start
                 )
-                world_x, world_y, world_z = (
-                    world_accel[0],
-                    world_accel[1],
-                    world_accel[2],
-                )
-
-                # In standard East-North-Up frame, XY plane is horizontal, Z is up
-                world_xy_magnitude = math.sqrt(world_x**2 + world_y**2)
-
-                # Update dashboard peaks with world coordinates
-                peak_z_accel = max(peak_z_accel, world_z)
-                peak_xy_accel = max(peak_xy_accel, world_xy_magnitude)
-
-                # Detection logic uses the new world values
-                current_time = time.time()
-
-                if world_z > JUMP_THRESHOLD:
-                    print("\n--- JUMP DETECTED! ---")
-                    keyboard.press(KEY_MAP["jump"])
-                    time.sleep(0.1)
-                    keyboard.release(KEY_MAP["jump"])
-                    # Reset peaks after an action
-                    peak_z_accel, peak_xy_accel = 0.0, 0.0
-
-                # Attack detection with improved conditions to prevent conflicts with jumps
-                elif (
-                    world_xy_magnitude > PUNCH_THRESHOLD
-                    and abs(world_z) < PUNCH_THRESHOLD * ATTACK_Z_STABILITY_FACTOR
-                    and current_time - last_attack_time > ATTACK_COOLDOWN_SEC
-                ):
-                    print(
-                        f"\n--- ATTACK DETECTED! --- (XY: {world_xy_magnitude:.1f}, Z: {world_z:.1f})"
-                    )
-                    keyboard.press(KEY_MAP["attack"])
-                    time.sleep(0.1)
-                    keyboard.release(KEY_MAP["attack"])
-                    # Update last attack time for debouncing
-                    last_attack_time = current_time
-                    # Reset peaks after an action
-                    peak_z_accel, peak_xy_accel = 0.0, 0.0
 
             # OLD: Gyroscope-based turn detection (replaced with rotation_vector)
             # elif sensor_type == 'gyroscope':
@@ -339,35 +477,388 @@ try:
             #         time.sleep(0.5)
             #         peak_yaw_rate = 0.0  # Reset after action
 
-            walk_status = "WALKING" if is_walking else "IDLE"
-
-            # Create walk fuel bar visualization
-            fuel_percentage = walk_fuel_seconds / MAX_FUEL_CAPACITY
-            fuel_bar_length = 8
-            filled_bars = int(fuel_percentage * fuel_bar_length)
-            empty_bars = fuel_bar_length - filled_bars
-            fuel_bar = "[" + "#" * filled_bars + "-" * empty_bars + "]"
-
-            # Updated dashboard to show world coordinates and walk fuel
-            dashboard_string = (
-                f"\rFacing: {facing_direction.upper().ljust(7)} | "
-                f"Walk: {walk_status.ljust(7)} | "
-                f"Fuel: {fuel_bar} {walk_fuel_seconds:.1f}s | "
-                f"World Z-A:{peak_z_accel:4.1f} | "
-                f"World XY-A:{peak_xy_accel:4.1f} | "
-                f"Yaw:{peak_yaw_rate:3.1f}"
+            walk_status = "WALKING" if self.is_walking else "IDLE"
+            if self.is_walking and self.walk_speed is not None:
+                walk_status = f"{self.walk_speed.speed:.0%} SPD"
+
+            dashboard_string = format_dashboard(
+                self.facing_direction,
+                walk_status,
+                self.walk_fuel_seconds,
+                self.max_fuel,
+                self.peak_z_accel,
+                self.peak_xy_accel,
+                self.peak_yaw_rate,
+            )
+            self._print(dashboard_string, end="")
+            packet_end = listener_stats.lap("dashboard", stage_start)
+            listener_stats.observe("packet", packet_end - packet_start)
+            return dashboard_string
+
+        except (
+            json.JSONDecodeError, UnicodeDecodeError, KeyError, TypeError, AttributeError, OverflowError
+        ):
+            # Malformed packets (bad UTF-8, missing fields, wrong types) are
+            # counted rather than printed so they can't flood the dashboard
+            # or stop the controller; see `python instrumentation.py stats`
+            listener_stats.count_error()
+            return None
+
+    def _process_acceleration(self, vals, timestamp_ns, current_time, packet_start, stage_start):
+        """Detect and actuate jumps, attacks and combos; returns the next lap start."""
+        listener_stats = self.listener_stats
+        threshold_adapter = self.threshold_adapter
+        jump_predictor = self.jump_predictor
+        action_scheduler = self.action_scheduler
+        analysis_pipeline = self.analysis_pipeline
+
+        accel_vector = [vals["x"], vals["y"], vals["z"]]
+
+        # Perform the transformation to world coordinates, using the
+        # orientation at this sample's own timestamp (see orientation.py)
+        world_accel = self.orientation_store.rotate(accel_vector, timestamp_ns)
+        world_x, world_y, world_z = (
+            world_accel[0],
+            world_accel[1],
+            world_accel[2],
+        )
+
+        # In standard East-North-Up frame, XY plane is horizontal, Z is up
+        world_xy_magnitude = math.sqrt(world_x**2 + world_y**2)
+
+        # Update dashboard peaks with world coordinates
+        self.peak_z_accel = max(self.peak_z_accel, world_z)
+        self.peak_xy_accel = max(self.peak_xy_accel, world_xy_magnitude)
+
+        # Sensor time, so network jitter doesn't distort peak
+        # capture, the predictor's slope or combo windows
+        sample_time = timestamp_ns / 1e9
+
+        # Keys still held follow the gesture ("gesture" and
+        # "proportional" hold policies)
+        action_scheduler.feed("jump", world_z)
+        action_scheduler.feed("attack", world_xy_magnitude)
+
+        if threshold_adapter is not None:
+            threshold_adapter.observe("jump", world_z, sample_time)
+            threshold_adapter.observe("attack", world_xy_magnitude, sample_time)
+            self.jump_threshold = threshold_adapter.threshold("jump")
+            self.punch_threshold = threshold_adapter.threshold("attack")
+            threshold_adapter.maybe_persist(current_time)
+        jump_threshold = self.jump_threshold
+        punch_threshold = self.punch_threshold
+
+        # Detection logic uses the new world values
+        action = detect_action(
+            world_z,
+            world_xy_magnitude,
+            jump_threshold,
+            punch_threshold,
+            current_time - self.last_attack_time,
+        )
+
+        if jump_predictor is not None:
+            # The predictor owns the jump: it presses on the rising
+            # edge, then confirms (normal jump) or cancels
+            if action == "jump":
+                action = None
+            jump_event = jump_predictor.update(world_z, sample_time, jump_threshold)
+            if jump_event == "early":
+                # Held until confirmed or cancelled; the limit only
+                # matters if packets stop mid-hop
+                action_scheduler.hold("jump", jump_predictor.confirm_window_sec + 0.05)
+                listener_stats.count_action("jump_early")
+            elif jump_event == "cancel":
+                action_scheduler.release("jump")
+                self._print("\n--- JUMP CANCELLED (not a jump) ---")
+                listener_stats.count_action("jump_cancelled")
+            elif jump_event in ("confirm", "jump"):
+                action = "jump"
+        elif not self.jump_armed:
+            if action == "jump":
+                action = None
+            if world_z < jump_threshold * JUMP_REARM_FRACTION:
+                self.jump_armed = True
+
+        combo = None
+        if self.combo_engine is not None and action is not None:
+            combo = self.combo_engine.observe(action, sample_time)
+        stage_start = listener_stats.lap("linear_acceleration", stage_start)
+
+        # Press first; messages and bookkeeping come after the key is down
+        if action == "jump":
+            self.jump_armed = False
+            # If the predictor pressed early, the hold counts from that press
+            if combo is None or "jump" not in combo["keys"]:
+                action_scheduler.trigger("jump", world_z, jump_threshold)
+        elif action == "attack":
+            if combo is None or "attack" not in combo["keys"]:
+                action_scheduler.trigger("attack", world_xy_magnitude, punch_threshold)
+            # Update last attack time for debouncing
+            self.last_attack_time = current_time
+        if combo is not None:
+            # The combo's keys replace the plain tap they include
+            self._fire_combo(combo, current_time, sample_time)
+        if action is not None:
+            listener_stats.observe("action", time.perf_counter_ns() - packet_start)
+
+        if action == "jump":
+            self._print("\n--- JUMP DETECTED! ---")
+            if threshold_adapter is not None:
+                threshold_adapter.confirm("jump", world_z, sample_time)
+            if analysis_pipeline is not None:
+                analysis_pipeline.submit(
+                    (
+                        "action",
+                        current_time,
+                        ("jump", {"world_z": world_z, "threshold": jump_threshold}),
+                    )
+                )
+
+        elif action == "attack":
+            self._print(
+                f"\n--- ATTACK DETECTED! --- (XY: {world_xy_magnitude:.1f}, Z: {world_z:.1f})"
+            )
+            if threshold_adapter is not None:
+                threshold_adapter.confirm("attack", world_xy_magnitude, sample_time)
+            if analysis_pipeline is not None:
+                analysis_pipeline.submit(
+                    (
+                        "action",
+                        current_time,
+                        (
+                            "attack",
+                            {
+                                "world_xy": world_xy_magnitude,
+                                "world_z": world_z,
+                                "threshold": punch_threshold,
+                            },
+                        ),
+                    )
+                )
+
+        if action is not None:
+            # Key output is timed on its own; releases happen on
+            # the scheduler's timer thread
+            listener_stats.count_action(action)
+            stage_start = listener_stats.lap("actuate", stage_start)
+            if self.gesture_log is not None:
+                self.gesture_log.record(
+                    action,
+                    current_time,
+                    sensor_time=sample_time,
+                    facing=self.facing_direction,
+                    world_z=world_z,
+                    world_xy=world_xy_magnitude,
+                    peak_z=self.peak_z_accel,
+                    peak_xy=self.peak_xy_accel,
+                    thresholds={"jump": jump_threshold, "attack": punch_threshold},
+                )
+            # Reset peaks after an action
+            self.peak_z_accel, self.peak_xy_accel = 0.0, 0.0
+        return stage_start
+
+    def close(self):
+        """Stop walking and release every key still held."""
+        if self.is_walking and self.walking_thread is not None:
+            self.stop_walking_event.set()
+            self.walking_thread.join()
+        self.action_scheduler.close()
+        if self.threshold_adapter is not None:
+            self.threshold_adapter.save_now()
+
+
+def main():
+    """Loads the configuration and runs the latency-critical listener loop."""
+    # Load configuration at startup
+    config = load_config()
+
+    # Auto-detect and update IP address. With discovery on, the listener
+    # binds every interface and phones get the address from the handshake,
+    # so there is nothing to guess or write back to config.json
+    if not config.get("discovery", {}).get("enabled", False):
+        print("🔍 Auto-detecting IP address...")
+        network_utils.update_config_ip()
+        # Reload config to get the updated IP
+        config = load_config()
+
+    # Extract configuration values
+    LISTEN_IP = config["network"]["listen_ip"]
+    LISTEN_PORT = config["network"]["listen_port"]
+
+    # --- NEW: Pluggable output backend (see output_backends.py) ---
+    try:
+        output_backend = create_backend(config)
+    except (ImportError, OSError, ValueError) as e:
+        backend_name = config.get("output", {}).get("backend", "pynput")
+        print(f"ERROR: Could not start the '{backend_name}' output backend: {e}")
+        if backend_name == "uinput":
+            print("uinput needs write access to /dev/uinput (try: sudo modprobe uinput).")
+        exit(1)
+
+    # --- NEW: Optional shared-memory feed for other processes ---
+    # Decoded samples are published so tools (recorders, visualizers, analysis)
+    # can read the live stream without re-parsing UDP JSON. See shared_ring.py.
+    ring_config = config.get("shared_ring", {})
+    sensor_ring = None
+    if ring_config.get("enabled", False):
+        sensor_ring = SensorRing.create(
+            ring_config.get("name", "silksong_sensors"),
+            ring_config.get("capacity", 4096),
+        )
+
+    # --- NEW: Offload non-critical analysis to a worker process ---
+    # Statistics and session logging run in analysis_pipeline.py's worker so
+    # they can never slow down receive -> decode -> detect -> actuate.
+    analysis_config = config.get("analysis", {})
+    analysis_pipeline = None
+    if analysis_config.get("enabled", False):
+        analysis_pipeline = AnalysisPipeline(
+            build_stages(analysis_config), analysis_config.get("queue_size", 512)
+        )
+        analysis_pipeline.start()
+
+    # --- NEW: Runtime instrumentation (see instrumentation.py) ---
+    # Counters are always on; profiles are started on demand with SIGUSR1 or
+    # `python instrumentation.py profile N` while the controller keeps running.
+    instrumentation_config = config.get("instrumentation", {})
+    listener_stats = ListenerStats()
+    profile_controller = ProfileController(
+        instrumentation_config.get("profile_dir", "profiles"),
+        instrumentation_config.get("profile_seconds", 10.0),
+    )
+    has_profile_signal = install_signal_handler(profile_controller)
+    control_server = None
+    control_port = instrumentation_config.get("control_port", 12346)
+    if instrumentation_config.get("control_enabled", True):
+        try:
+            control_server = ControlServer(control_port, listener_stats, profile_controller)
+            control_server.start()
+        except OSError as e:
+            print(f"Warning: Control port {control_port} unavailable ({e}); runtime commands disabled.")
+
+    # --- NEW: Buffered gesture log (see gesture_log.py) ---
+    gesture_log_config = config.get("gesture_log", {})
+    gesture_log = None
+    if gesture_log_config.get("enabled", False):
+        gesture_log = GestureLog(
+            gesture_log_config.get("file", "gestures.jsonl"),
+            gesture_log_config.get("flush_interval_sec", 1.0),
+            gesture_log_config.get("max_buffer", 1000),
+        )
+        gesture_log.start()
+
+    # --- Per-packet work: detection, thresholds, key holds and combos ---
+    try:
+        processor = PacketProcessor(
+            config, output_backend, listener_stats, sensor_ring, analysis_pipeline, gesture_log
+        )
+    except ValueError as e:
+        print(f"ERROR: Invalid 'actions' settings in config.json: {e}")
+        output_backend.close()
+        exit(1)
+
+    metrics_server = None
+    if instrumentation_config.get("metrics_enabled", False):
+        metrics_host = instrumentation_config.get("metrics_host", "127.0.0.1")
+        metrics_port = instrumentation_config.get("metrics_port", 9105)
+        try:
+            metrics_server = MetricsServer(
+                metrics_host, metrics_port, listener_stats, processor.metrics_state
             )
-            print(dashboard_string, end="")
-
-        except (json.JSONDecodeError, KeyError):
-            # Temporarily print errors to see if we have issues
-            # print(f"Error processing packet: {e}")
-            pass
-
-except KeyboardInterrupt:
-    print("\nController stopped.")
-finally:
-    if is_walking and walking_thread is not None:
-        stop_walking_event.set()
-        walking_thread.join()
-    sock.close()
+            metrics_server.start()
+        except OSError as e:
+            print(f"Warning: Metrics port {metrics_port} unavailable ({e}); metrics disabled.")
+
+    # --- NEW: Zero-config discovery and session handshake (see discovery.py) ---
+    discovery_config = config.get("discovery", {})
+    discovery_server = None
+    if discovery_config.get("enabled", False):
+        # Listen on every interface so a new Wi-Fi address doesn't strand the
+        # socket; phones learn the current address from the handshake
+        LISTEN_IP = "0.0.0.0"
+        try:
+            discovery_server = DiscoveryServer(
+                LISTEN_PORT,
+                discovery_config.get("port", 12347),
+                discovery_config.get("multicast_group", "239.255.77.77"),
+                discovery_config.get("heartbeat_ms", 250),
+                discovery_config.get("session_timeout_sec", 30.0),
+            )
+            discovery_server.start()
+        except OSError as e:
+            print(f"Warning: Discovery port unavailable ({e}); phones need the IP typed in.")
+
+    # --- Main Listener Logic ---
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind((LISTEN_IP, LISTEN_PORT))
+
+    print("--- Silksong Controller v1.0 (Final) ---")
+    print(f"Listening on {LISTEN_IP}:{LISTEN_PORT}")
+    print("Official Hollow Knight/Silksong key mappings:")
+    print(
+        f"  Movement: {config['keyboard_mappings']['left']}/{config['keyboard_mappings']['right']} (direction-based)"
+    )
+    print(
+        f"  Jump: {config['keyboard_mappings']['jump']} | Attack: {config['keyboard_mappings']['attack']}"
+    )
+    print(f"Output backend: {output_backend.name}")
+    if processor.walk_speed is not None:
+        walk_output = "analog stick" if output_backend.supports_analog else "key pulsing"
+        print(f"Walk speed: follows step cadence ({walk_output})")
+    if processor.combo_engine is not None:
+        print(f"Combos: {', '.join(combo.get('name', 'combo') for combo in processor.combo_specs)}")
+    if processor.jump_predictor is not None:
+        print(f"Predictive jump: ON (aggressiveness {processor.jump_predictor.aggressiveness:.2f})")
+    if processor.threshold_adapter is not None:
+        print("Adaptive thresholds: ON (learned values are saved to config.json, calibration is kept)")
+    if analysis_pipeline is not None:
+        print(f"Analysis stages in worker process: {', '.join(analysis_config.get('stages', []))}")
+    if sensor_ring is not None:
+        print(f"Sharing decoded samples in shared memory '{ring_config.get('name', 'silksong_sensors')}'")
+    if control_server is not None:
+        print(f"Control port: 127.0.0.1:{control_port} (python instrumentation.py stats)")
+    if discovery_server is not None:
+        print(f"Discovery: answering phones on port {discovery_server.port} (sessions resume after Wi-Fi drops)")
+    if metrics_server is not None:
+        print(f"Metrics: http://{metrics_host}:{metrics_port}/metrics")
+    if gesture_log is not None:
+        print(f"Logging gestures to {gesture_log.path}")
+    if has_profile_signal:
+        print(f"Profiling: kill -USR1 {os.getpid()}")
+    print("---------------------------------------")
+
+    try:
+        while True:
+            data, addr = sock.recvfrom(2048)
+            profile_controller.poll()
+            processor.process(data, time.time(), time.perf_counter_ns())
+
+    except KeyboardInterrupt:
+        print("\nController stopped.")
+        print(listener_stats.format_report())
+        print(
+            f"Key releases: {processor.action_scheduler.releases} "
+            f"(worst {processor.action_scheduler.max_lateness_sec * 1000:.2f}ms late)"
+        )
+    finally:
+        profile_controller.stop()
+        if control_server is not None:
+            control_server.close()
+        if metrics_server is not None:
+            metrics_server.close()
+        if discovery_server is not None:
+            discovery_server.close()
+        if gesture_log is not None:
+            gesture_log.close()
+        processor.close()
+        if sensor_ring is not None:
+            sensor_ring.close()
+        if analysis_pipeline is not None:
+            analysis_pipeline.stop()
+        output_backend.close()
+        sock.close()
+
+
+if __name__ == "__main__":
+    main()
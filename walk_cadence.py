@@ -0,0 +1,123 @@
+"""
+Analog walking speed from step cadence.
+
+The walk fuel system decides *whether* the character walks. This module
+decides *how fast*: an exponential moving average of the intervals between
+step_detector events gives the player's cadence, which maps to a speed in
+[min_speed, 1.0]. Fast stepping runs, slow stepping creeps.
+
+The speed is recomputed only when a step arrives, so other packets cost
+nothing. The walker thread then either sets an analog stick (gamepad-capable
+backends) or pulses the direction key with a matching duty cycle (keyboards).
+"""
+
+import time
+
+from orientation import CLOCK_RESET_SEC
+
+
+class CadenceEstimator:
+    """Constant-memory EMA of step intervals, fed with sensor timestamps."""
+
+    def __init__(self, smoothing=0.3, min_interval_sec=0.15, max_interval_sec=1.5):
+        self.smoothing = smoothing
+        # Closer steps are sensor double-fires; longer gaps mean a fresh start
+        self.min_interval_sec = min_interval_sec
+        self.max_interval_sec = max_interval_sec
+        self.interval = None
+        self.last_step = None
+
+    def add_step(self, t):
+        if self.last_step is not None:
+            dt = t - self.last_step
+            if dt < -CLOCK_RESET_SEC:
+                # New sensor clock: start the cadence over
+                self.interval = None
+                self.last_step = t
+                return
+            if dt < self.min_interval_sec:
+                return
+            if dt > self.max_interval_sec:
+                self.interval = None
+            elif self.interval is None:
+                self.interval = dt
+            else:
+                self.interval += self.smoothing * (dt - self.interval)
+        self.last_step = t
+
+    def steps_per_sec(self):
+        """Returns the current cadence, or None until two steps have been seen."""
+        if self.interval is None:
+            return None
+        return 1.0 / self.interval
+
+
+class WalkSpeedModel:
+    """Turns cadence into a walking speed the walker thread can read at any time."""
+
+    def __init__(self, walk_config):
+        self.cadence = CadenceEstimator(
+            walk_config.get("smoothing", 0.3),
+            walk_config.get("min_step_interval_sec", 0.15),
+            walk_config.get("max_step_interval_sec", 1.5),
+        )
+        self.slow_steps_per_sec = walk_config.get("slow_steps_per_sec", 1.0)
+        self.fast_steps_per_sec = walk_config.get("fast_steps_per_sec", 2.5)
+        self.min_speed = walk_config.get("min_speed", 0.3)
+        self.pwm_period_sec = walk_config.get("pwm_period_sec", 0.2)
+        # Until the cadence is known, walk at the slowest speed
+        self.speed = self.min_speed
+
+    def add_step(self, t):
+        self.cadence.add_step(t)
+        steps_per_sec = self.cadence.steps_per_sec()
+        if steps_per_sec is None:
+            self.speed = self.min_speed
+            return
+
+        span = self.fast_steps_per_sec - self.slow_steps_per_sec
+        fraction = (steps_per_sec - self.slow_steps_per_sec) / span if span > 0 else 1.0
+        fraction = min(1.0, max(0.0, fraction))
+        self.speed = self.min_speed + (1.0 - self.min_speed) * fraction
+
+
+def drive_walk(backend, direction, stop_event, model):
+    """
+    Walk in one direction at the model's current speed until stop_event is set.
+
+    Runs on the walker thread. Analog backends get a stick position refreshed
+    once per PWM period; keyboard backends get the key held for speed x period
+    out of every period, on a drift-free schedule.
+    """
+    period = model.pwm_period_sec
+
+    if backend.supports_analog:
+        sign = 1.0 if direction == "right" else -1.0
+        while True:
+            backend.set_walk_axis(sign * model.speed)
+            if stop_event.wait(period):
+                break
+        backend.set_walk_axis(0.0)
+        return
+
+    pressed = False
+    cycle_start = time.perf_counter()
+    while not stop_event.is_set():
+        duty = model.speed
+        if not pressed:
+            backend.press(direction)
+            pressed = True
+
+        if duty < 1.0:
+            release_at = cycle_start + period * duty
+            if stop_event.wait(max(0.0, release_at - time.perf_counter())):
+                break
+            backend.release(direction)
+            pressed = False
+
+        cycle_start += period
+        if stop_event.wait(max(0.0, cycle_start - time.perf_counter())):
+            break
+
+    if pressed:
+        backend.release(direction)